@@ -0,0 +1,212 @@
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+# Admin / Diagnostics Endpoints
+# Only mounted when ADMIN_TOKEN is set (see main.py), so a default deployment
+# has no routes, no background work and no tracing. Every tool here is started
+# on demand and stops by itself or when asked to.
+#
+#   curl -X POST -H "X-Admin-Token: $ADMIN_TOKEN" "$URL/admin/profile/cpu/start?seconds=20"
+#   curl -X POST -H "X-Admin-Token: $ADMIN_TOKEN" "$URL/admin/profile/cpu/stop"
+#   curl -X POST -H "X-Admin-Token: $ADMIN_TOKEN" "$URL/admin/memory/snapshot"
+#   curl -H "X-Admin-Token: $ADMIN_TOKEN" "$URL/admin/loop-lag?seconds=5"
+#   curl -H "X-Admin-Token: $ADMIN_TOKEN" "$URL/admin/sessions"
+#   curl -H "X-Admin-Token: $ADMIN_TOKEN" "$URL/admin/tools"
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+MAX_PROFILE_SECONDS = 300
+
+# --- CPU Sampling Profiler ---
+
+class CpuSampler:
+    """
+    Samples the event-loop thread's stack from a helper thread. Nothing is
+    installed in the profiled thread, so its overhead is one stack walk per tick.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+        # Guards `stacks`/`samples`: report() runs on the loop while _run adds keys
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float):
+        self.started_at = time.time()
+        deadline = time.monotonic() + seconds
+        self._thread = threading.Thread(target=self._run, args=(deadline,), name="cpu-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self, deadline: float):
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            with self._lock:
+                self.stacks[key] += 1
+                self.samples += 1
+        self.stopped_at = time.time()
+
+    def report(self, top: int = 30) -> dict:
+        with self._lock:
+            stacks = Counter(self.stacks)
+            samples = self.samples
+
+        # Self time = innermost frame of each sample
+        self_counts = Counter()
+        for stack, count in stacks.items():
+            self_counts[stack.rsplit(";", 1)[-1]] += count
+
+        def pct(count):
+            return round(100 * count / samples, 1) if samples else 0.0
+
+        return {
+            "running": self.running,
+            "samples": samples,
+            "interval_ms": self.interval * 1000,
+            "duration_s": round((self.stopped_at or time.time()) - self.started_at, 2),
+            "top_self": [{"frame": f, "samples": c, "pct": pct(c)} for f, c in self_counts.most_common(top)],
+            # Collapsed stacks ("a;b;c count"), ready for flamegraph.pl / speedscope
+            "collapsed": [f"{s} {c}" for s, c in stacks.most_common(top * 10)],
+        }
+
+# --- Event Loop Lag ---
+
+async def measure_loop_lag(seconds: float, interval: float = 0.05) -> dict:
+    """How late the loop wakes a task that asked to sleep `interval` seconds."""
+    lags = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.monotonic() - started - interval))
+
+    lags.sort()
+    def at(q):
+        return round(lags[min(len(lags) - 1, int(q * len(lags)))] * 1000, 2)
+
+    return {
+        "samples": len(lags),
+        "interval_ms": interval * 1000,
+        "p50_ms": at(0.50),
+        "p99_ms": at(0.99),
+        "max_ms": round(lags[-1] * 1000, 2),
+    }
+
+# --- Router ---
+
+def require_admin(x_admin_token: str = Header(None)):
+    if not ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+def create_admin_router(session_manager) -> APIRouter:
+    router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+    state = {"sampler": None, "snapshot": None}
+
+    @router.post("/profile/cpu/start")
+    async def start_cpu_profile(seconds: float = 30, interval_ms: float = 5):
+        sampler = state["sampler"]
+        if sampler and sampler.running:
+            raise HTTPException(status_code=409, detail="Profile already running")
+        seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+        # Handlers run on the event-loop thread, which is what we want to sample
+        sampler = CpuSampler(threading.get_ident(), interval=max(interval_ms, 1) / 1000)
+        sampler.start(seconds)
+        state["sampler"] = sampler
+        return {"status": "started", "seconds": seconds}
+
+    @router.post("/profile/cpu/stop")
+    async def stop_cpu_profile(top: int = 30):
+        sampler = state["sampler"]
+        if sampler is None:
+            raise HTTPException(status_code=404, detail="No profile")
+        sampler.stop()
+        return sampler.report(top)
+
+    @router.get("/profile/cpu")
+    async def get_cpu_profile(top: int = 30):
+        sampler = state["sampler"]
+        if sampler is None:
+            raise HTTPException(status_code=404, detail="No profile")
+        return sampler.report(top)
+
+    @router.post("/memory/snapshot")
+    async def memory_snapshot(top: int = 25, frames: int = 1):
+        # First call starts tracing; the baseline is the snapshot taken here.
+        # Later calls return the top allocations and the diff since the last call.
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(frames, 1))
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        previous, state["snapshot"] = state["snapshot"], snapshot
+        current, peak = tracemalloc.get_traced_memory()
+
+        result = {
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "top": [str(stat) for stat in snapshot.statistics("lineno")[:top]],
+        }
+        if previous is not None:
+            result["diff"] = [str(stat) for stat in snapshot.compare_to(previous, "lineno")[:top]]
+        return result
+
+    @router.post("/memory/stop")
+    async def memory_stop():
+        state["snapshot"] = None
+        tracemalloc.stop()
+        return {"status": "stopped"}
+
+    @router.get("/loop-lag")
+    async def loop_lag(seconds: float = 5, interval_ms: float = 50):
+        seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+        return await measure_loop_lag(seconds, max(interval_ms, 1) / 1000)
+
+    @router.get("/sessions")
+    async def list_sessions():
+        return {
+            **session_manager.stats(),
+            "sessions": [agent.snapshot() for agent in list(session_manager.sessions)],
+        }
+
+    @router.get("/tools")
+    async def list_tools():
+        from agent.tools import registry
+        return {
+            name: {
+                "breaker": tool.breaker.state,
+                "consecutive_failures": tool.breaker.failures,
+                "timeout_s": tool.timeout,
+            }
+            for name, tool in registry.tools.items()
+        }
+
+    return router
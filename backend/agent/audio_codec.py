@@ -0,0 +1,121 @@
+import base64
+
+# Binary downstream audio framing.
+#
+# In binary mode the inline audio is pulled out of Gemini's serverContent and
+# sent to the browser as its own binary WebSocket frame:
+#
+#   byte 0     codec id (CODEC_PCM16 / CODEC_MULAW)
+#   bytes 1..  payload: raw little-endian PCM16, or one G.711 mu-law byte per sample
+#
+# Everything else (text, turnComplete, interrupted, ...) keeps going down as a
+# small JSON frame. Audio is always 24kHz mono, same as the JSON path.
+
+CODEC_PCM16 = 0
+CODEC_MULAW = 1
+
+# Query param value on /ws/audio -> codec id. "json" keeps the legacy behaviour.
+AUDIO_MODES = {"pcm16": CODEC_PCM16, "mulaw": CODEC_MULAW}
+
+_MULAW_BIAS = 0x84
+_MULAW_CLIP = 32635
+
+# Lookup tables are built on first use so importing the agent stays cheap and
+# NumPy is only loaded once mu-law or mic level checks are actually used.
+_encode_table = None
+_decode_table = None
+
+def _tables():
+    global _encode_table, _decode_table
+    if _encode_table is None:
+        import numpy as np
+
+        # Encode: one entry per int16 value, indexed by its uint16 bit pattern
+        x = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32)
+        sign = (x < 0).astype(np.int32) << 7
+        mag = np.minimum(np.abs(x), _MULAW_CLIP) + _MULAW_BIAS
+        exponent = np.frexp(mag)[1].astype(np.int32) - 8
+        mantissa = (mag >> (exponent + 3)) & 0x0F
+        _encode_table = (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+        # Decode: 256 entries
+        u = ~np.arange(256, dtype=np.int32) & 0xFF
+        exponent = (u >> 4) & 0x07
+        mantissa = u & 0x0F
+        sample = (((mantissa << 3) + _MULAW_BIAS) << exponent) - _MULAW_BIAS
+        _decode_table = np.where(u & 0x80, -sample, sample).astype("<i2")
+    return _encode_table, _decode_table
+
+def mulaw_encode(pcm: bytes) -> bytes:
+    """PCM16 little-endian -> mu-law (half the bytes)."""
+    import numpy as np
+
+    encode_table, _ = _tables()
+    samples = np.frombuffer(pcm, dtype="<u2", count=len(pcm) // 2)
+    return encode_table[samples].tobytes()
+
+def mulaw_decode(data: bytes) -> bytes:
+    """mu-law -> PCM16 little-endian."""
+    import numpy as np
+
+    _, decode_table = _tables()
+    return decode_table[np.frombuffer(data, dtype=np.uint8)].tobytes()
+
+def pcm16_rms(pcm: bytes) -> float:
+    """Root-mean-square level of PCM16 little-endian audio (0 .. 32768)."""
+    import numpy as np
+
+    samples = np.frombuffer(pcm, dtype="<i2", count=len(pcm) // 2).astype(np.float32)
+    if not samples.size:
+        return 0.0
+    return float(np.sqrt(np.mean(samples * samples)))
+
+def encode_frame(pcm: bytes, codec: int) -> bytes:
+    if codec == CODEC_MULAW:
+        return bytes([CODEC_MULAW]) + mulaw_encode(pcm)
+    return bytes([CODEC_PCM16]) + pcm
+
+def decode_frame(frame: bytes) -> bytes:
+    """Binary frame -> PCM16 little-endian (used by benchmarks and tooling)."""
+    codec, payload = frame[0], frame[1:]
+    if codec == CODEC_MULAW:
+        return mulaw_decode(payload)
+    if codec == CODEC_PCM16:
+        return bytes(payload)
+    raise ValueError(f"Unknown audio codec id: {codec}")
+
+def split_audio(response: dict):
+    """
+    Pull inline audio parts out of a Gemini message.
+    Returns (pcm_chunks, remainder); remainder is None when nothing but audio
+    was in the message. The input dict is not modified.
+    """
+    server_content = response.get("serverContent")
+    if not server_content:
+        return [], response
+    model_turn = server_content.get("modelTurn")
+    if not model_turn or "parts" not in model_turn:
+        return [], response
+
+    pcm_chunks = []
+    other_parts = []
+    for part in model_turn["parts"]:
+        inline = part.get("inlineData")
+        if inline and inline.get("mimeType", "").startswith("audio/"):
+            pcm_chunks.append(base64.b64decode(inline["data"]))
+        else:
+            other_parts.append(part)
+
+    if not pcm_chunks:
+        return [], response
+
+    server_content = dict(server_content)
+    if other_parts:
+        server_content["modelTurn"] = {**model_turn, "parts": other_parts}
+    else:
+        del server_content["modelTurn"]
+
+    remainder = {k: v for k, v in response.items() if k != "serverContent"}
+    if server_content:
+        remainder["serverContent"] = server_content
+    return pcm_chunks, (remainder or None)
@@ -1,22 +1,146 @@
 import asyncio
+import base64
 import json
 import os
+import time
 import websockets
 from fastapi import WebSocket, WebSocketDisconnect
 from dotenv import load_dotenv
+import db
 from .tools import DEFINITIONS, execute_tool
+from .audio_codec import encode_frame, pcm16_rms, split_audio
+from . import recorder
 
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 MODEL = "models/gemini-2.5-flash-native-audio-preview-12-2025" # User requested preview
 HOST = "generativelanguage.googleapis.com"
+# realtime_input envelope for binary mic frames; the base64 payload goes in between
+REALTIME_AUDIO_PREFIX = '{"realtime_input":{"media_chunks":[{"mime_type":"audio/pcm","data":"'
+REALTIME_AUDIO_SUFFIX = '"}]}}'
+
 URI = f"wss://{HOST}/ws/google.ai.generativelanguage.v1alpha.GenerativeService.BidiGenerateContent?key={GEMINI_API_KEY}"
 
+def user_context_from_profile(profile):
+    """Flatten a user profile into (user_name, user_context)."""
+    # Profile is already flat {"name": "Mukesh", "memories": [{...}]} 
+    # Actually wait, In-Memory db returns {"memories": [{"key":.., "value":..}]} in default user
+    # but the `memories` loop needs to look at `profile['memories']`.
+    
+    user_name = profile.get("name", "User")
+    user_city = profile.get("city", "Unknown")
+    user_tz = profile.get("timezone", "UTC")
+    user_gender = profile.get("gender", "Unknown")
+    
+    memories = profile.get("memories", [])
+    memory_str = ". ".join([f"{m['key']}: {m['value']}" for m in memories])
+    
+    user_context = f"User Name: {user_name}. User City: {user_city}. User Timezone: {user_tz}. User Gender: {user_gender}. {memory_str}"
+    return user_name, user_context
+
+async def fetch_user_context(user_id: str):
+    """Fetch User Context (Async), falling back to a placeholder on DB errors."""
+    print("DEBUG: Fetching user profile from DB...", flush=True)
+    try:
+        profile = await db.get_user_profile(user_id)
+        print(f"DEBUG: Profile fetched: {profile}", flush=True)
+        return user_context_from_profile(profile)
+    except Exception as e:
+        print(f"Error fetching user context: {e}")
+        return "User", "User Context Unavailable"
+
+def build_setup_message(context):
+    """Build the Bidi setup message (System Instructions, Tools)."""
+    user_name, user_context = context
+    setup_msg = {
+        "setup": {
+            "model": MODEL,
+            "generation_config": {
+                "response_modalities": ["AUDIO"]
+            },
+            "tools": DEFINITIONS,
+                "system_instruction": {
+                    "parts": [
+                        {
+                            "text": f"""
+                            You are Pulu, a helpful, voice-based AI assistant. You are talking to {user_name}. Context: {user_context}. 
+                            
+                            CRITICAL IDENTITY:
+                            - You are a **Private Personal Assistant**.
+                            - You are **Authorized** and **Expected** to remember personal details (e.g., Door Codes, Wi-Fi Passwords, Favorite Colors, Car details) when the user asks.
+                            - **Time Awareness**: Always use the 'User Timezone' from the context for current time, dates, and scheduling.
+                            - **Privacy**: This data is stored locally for the user's convenience. Do NOT refuse to store this information.
+
+                            Talk in friendly and concise manner.
+                            
+                            CRITICAL RULE:
+                            If an alarm or timer is ringing (status='RINGING', or user implies it's noisy), and the user says 'Stop', 'Silence', 'Quiet', or 'Dismiss', 
+                            you MUST call `handle_alarm(action='delete')` AND `handle_timer(action='delete')` immediately. 
+                            Do NOT ask for clarification. Just assume they want to stop the noise.
+                            """
+                        }
+                    ]
+                }
+        }
+    }
+    return setup_msg
+
+# Setup payload built ahead of time by the startup warm-up (see main.lifespan).
+# It is handed to the default user's first session only, and only if that
+# session arrives within PREBUILT_SETUP_TTL seconds; otherwise the profile may
+# have changed since (e.g. on another instance) and is fetched again.
+PREBUILT_SETUP_TTL = float(os.getenv("PREBUILT_SETUP_TTL", "60"))
+_prebuilt_setup = None  # (user_id, built_at, setup_msg)
+
+async def prebuild_setup():
+    """Fetch the profile and cache the setup payload; raises on DB errors."""
+    global _prebuilt_setup
+
+    profile = await db.get_user_profile(db.DEFAULT_USER_ID)
+    setup_msg = build_setup_message(user_context_from_profile(profile))
+    _prebuilt_setup = (db.DEFAULT_USER_ID, time.monotonic(), setup_msg)
+
+def take_prebuilt_setup(user_id: str):
+    global _prebuilt_setup
+    if _prebuilt_setup is None or _prebuilt_setup[0] != user_id:
+        return None
+    _, built_at, setup_msg = _prebuilt_setup
+    _prebuilt_setup = None
+    if time.monotonic() - built_at > PREBUILT_SETUP_TTL:
+        return None  # Stale: let the session fetch a fresh profile
+    return setup_msg
+
 class GeminiAgent:
-    def __init__(self, client_ws: WebSocket):
+    def __init__(self, client_ws: WebSocket, user_id: str = db.DEFAULT_USER_ID, audio_codec: int = None,
+                 idle_timeout: float = 0, activity_rms: float = 0):
         self.client_ws = client_ws
+        self.user_id = user_id
         self.gemini_ws = None
+        self.gemini_task = None
+        # None = legacy JSON downstream; otherwise a codec id from audio_codec
+        self.audio_codec = audio_codec
+        # Close the upstream socket after this many seconds without speech
+        # from the client or messages from Gemini (0 = never); it is reopened
+        # on the next utterance. Mic frames quieter than `activity_rms` are
+        # silence and don't count (0 = every frame counts).
+        self.idle_timeout = idle_timeout
+        self.activity_rms = activity_rms
+        self.last_activity = time.monotonic()
+        self.watchdog_task = None
+        # Set by close(); nothing may reopen the upstream after that
+        self.closed = False
+        # Byte/message counters, reported by the admin /admin/sessions endpoint
+        self.started_at = time.time()
+        self.counters = {
+            "client_in_bytes": 0, "client_out_bytes": 0,
+            "upstream_in_bytes": 0, "upstream_out_bytes": 0,
+            "upstream_opens": 0,
+        }
+        # Opt-in session recording (RECORD_SESSIONS_DIR), see recorder.py
+        self.recorder = recorder.open_session_recorder(f"{id(self):x}")
+        if self.recorder:
+            self.recorder.record(recorder.META, json.dumps({"audio_codec": audio_codec, "started_at": self.started_at}))
 
     async def run(self):
         # TODO: Basic Bidi implementation
@@ -24,91 +148,127 @@ class GeminiAgent:
         # Ideally, we establish connection to Gemini here
         try:
             print(f"DEBUG: GeminiAgent.run started. URI: {URI[:20]}...", flush=True)
-            async with websockets.connect(URI) as ws:
-                print("DEBUG: Connected to Gemini Websocket", flush=True)
-                self.gemini_ws = ws
-                
-                # Fetch User Context (Async)
-                print("DEBUG: Fetching user profile from DB...", flush=True)
-                import db
-                
-                try:
-                    profile = await db.get_user_profile()
-                    print(f"DEBUG: Profile fetched: {profile}", flush=True)
-                    # Profile is already flat {"name": "Mukesh", "memories": [{...}]} 
-                    # Actually wait, In-Memory db returns {"memories": [{"key":.., "value":..}]} in default user
-                    # but the `memories` loop needs to look at `profile['memories']`.
-                    
-                    user_name = profile.get("name", "User")
-                    user_city = profile.get("city", "Unknown")
-                    user_tz = profile.get("timezone", "UTC")
-                    user_gender = profile.get("gender", "Unknown")
-                    
-                    memories = profile.get("memories", [])
-                    memory_str = ". ".join([f"{m['key']}: {m['value']}" for m in memories])
-                    
-                    user_context = f"User Name: {user_name}. User City: {user_city}. User Timezone: {user_tz}. User Gender: {user_gender}. {memory_str}"
-                except Exception as e:
-                    print(f"Error fetching user context: {e}")
-                    user_context = "User Context Unavailable"
-
-                # Send Initial Setup (System Instructions, Tools)
-                setup_msg = {
-                    "setup": {
-                        "model": MODEL,
-                        "generation_config": {
-                            "response_modalities": ["AUDIO"]
-                        },
-                        "tools": DEFINITIONS,
-                            "system_instruction": {
-                                "parts": [
-                                    {
-                                        "text": f"""
-                                        You are Pulu, a helpful, voice-based AI assistant. You are talking to {user_name}. Context: {user_context}. 
-                                        
-                                        CRITICAL IDENTITY:
-                                        - You are a **Private Personal Assistant**.
-                                        - You are **Authorized** and **Expected** to remember personal details (e.g., Door Codes, Wi-Fi Passwords, Favorite Colors, Car details) when the user asks.
-                                        - **Time Awareness**: Always use the 'User Timezone' from the context for current time, dates, and scheduling.
-                                        - **Privacy**: This data is stored locally for the user's convenience. Do NOT refuse to store this information.
-
-                                        Talk in friendly and concise manner.
-                                        
-                                        CRITICAL RULE:
-                                        If an alarm or timer is ringing (status='RINGING', or user implies it's noisy), and the user says 'Stop', 'Silence', 'Quiet', or 'Dismiss', 
-                                        you MUST call `handle_alarm(action='delete')` AND `handle_timer(action='delete')` immediately. 
-                                        Do NOT ask for clarification. Just assume they want to stop the noise.
-                                        """
-                                    }
-                                ]
-                            }
-                    }
-                }
-                await ws.send(json.dumps(setup_msg))
+            # Tell the browser it may send mic audio as binary PCM16 frames
+            await self.send_json_to_client({"type": "hello", "binary_audio_in": True})
+            await self.open_upstream()
 
-                # Start loop
-                await asyncio.gather(
-                    self.receive_from_client(),
-                    self.receive_from_gemini()
-                )
+            # Start loop
+            self.watchdog_task = asyncio.create_task(self.idle_watchdog())
+            try:
+                await self.receive_from_client()
+            finally:
+                self.watchdog_task.cancel()
         except Exception as e:
             print(f"Gemini Error: {e}")
             await self.client_ws.close()
 
+    async def open_upstream(self):
+        # Use the payload pre-built during startup warm-up if there is one,
+        # otherwise fetch User Context (Async) while the upstream handshake runs
+        setup_msg = take_prebuilt_setup(self.user_id)
+        context_task = None
+        if setup_msg is None:
+            context_task = asyncio.create_task(fetch_user_context(self.user_id))
+
+        ws = None
+        try:
+            ws = await websockets.connect(URI)
+            print("DEBUG: Connected to Gemini Websocket", flush=True)
+            if setup_msg is None:
+                setup_msg = build_setup_message(await context_task)
+            await self.send_upstream(ws, json.dumps(setup_msg))
+        except BaseException:
+            # Connect or setup failed (or we were cancelled): don't leave the
+            # profile fetch or the socket behind
+            if context_task:
+                context_task.cancel()
+            if ws:
+                await ws.close()
+            raise
+
+        self.gemini_ws = ws
+        self.counters["upstream_opens"] += 1
+        if self.recorder:
+            self.recorder.record(recorder.UPSTREAM_OPEN)
+        self.last_activity = time.monotonic()
+        self.gemini_task = asyncio.create_task(self.receive_from_gemini(ws))
+
+    async def close_upstream(self):
+        ws, self.gemini_ws = self.gemini_ws, None
+        if ws:
+            await ws.close()
+        # receive_from_gemini ends on its own once the socket is closed
+
+    async def idle_watchdog(self):
+        if not self.idle_timeout:
+            return
+        while True:
+            await asyncio.sleep(min(self.idle_timeout, 5))
+            if self.gemini_ws and time.monotonic() - self.last_activity > self.idle_timeout:
+                print(f"DEBUG: Session idle for {self.idle_timeout}s, closing Gemini socket", flush=True)
+                await self.close_upstream()
+
     async def receive_from_client(self):
         try:
             while True:
                 # Receive Audio/Text from Client
-                data = await self.client_ws.receive_json()
-                # Forward to Gemini (formatted correctly)
-                if "realtime_input" in data:
-                     await self.gemini_ws.send(json.dumps(data))
+                message = await self.client_ws.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+
+                raw = message.get("bytes")
+                if raw is not None:
+                    # Binary frame = raw PCM16 mic audio (AudioWorklet path).
+                    # Gemini only takes base64 JSON, so wrap it here instead of in the browser.
+                    self.counters["client_in_bytes"] += len(raw)
+                    if self.recorder:
+                        self.recorder.record(recorder.CLIENT_IN_BINARY, raw)
+                    text = REALTIME_AUDIO_PREFIX + base64.b64encode(raw).decode() + REALTIME_AUDIO_SUFFIX
+                    voiced = self.is_voiced(raw)
+                else:
+                    text = message.get("text") or ""
+                    self.counters["client_in_bytes"] += len(text)
+                    if self.recorder:
+                        self.recorder.record(recorder.CLIENT_IN, text)
+                    # Forward to Gemini (formatted correctly)
+                    data = json.loads(text)
+                    if "realtime_input" not in data:
+                        continue
+                    voiced = self.is_voiced_input(data["realtime_input"])
+
+                if voiced:
+                    self.last_activity = time.monotonic()
+                if self.gemini_ws is None:
+                    if self.closed:
+                        break  # Shutting down: don't reopen
+                    if not voiced:
+                        continue  # Reaped while idle and the mic is still silent
+                    # Reaped while idle: reopen on the next utterance
+                    print("DEBUG: Reopening Gemini socket", flush=True)
+                    await self.open_upstream()
+                # Already valid JSON: forward the text, no re-encoding
+                await self.send_upstream(self.gemini_ws, text)
         except WebSocketDisconnect:
             pass
 
-    async def receive_from_gemini(self):
+    def is_voiced(self, pcm: bytes) -> bool:
+        """Whether a PCM16 mic frame is loud enough to count as activity."""
+        return not self.activity_rms or pcm16_rms(pcm) >= self.activity_rms
+
+    def is_voiced_input(self, realtime_input: dict) -> bool:
+        # Legacy JSON mic path: base64 PCM16 in media_chunks
+        chunks = [c for c in realtime_input.get("media_chunks") or [] if c.get("mime_type", "").startswith("audio/")]
+        if not chunks or not self.activity_rms:
+            return True
+        return any(self.is_voiced(base64.b64decode(c.get("data", ""))) for c in chunks)
+
+    async def receive_from_gemini(self, ws):
         try:
-            async for msg in self.gemini_ws:
+            async for msg in ws:
+                self.last_activity = time.monotonic()
+                self.counters["upstream_in_bytes"] += len(msg)
+                if self.recorder:
+                    self.recorder.record(recorder.UPSTREAM_IN, msg)
                 try:
                     response = json.loads(msg)
                     # print(f"DEBUG: Raw Gemini Msg keys: {list(response.keys())}") # Too noisy?
@@ -128,7 +288,7 @@ class GeminiAgent:
                                     print(f"DEBUG: Gemini requested tool: {name}")
                                     print(f"DEBUG: Tool Args: {args}")
                                     
-                                    result = await execute_tool(name, args)
+                                    result = await self.run_tool(name, args)
                                     print(f"DEBUG: Tool Execution Result: {result}")
 
                                     # Send Tool Response Back
@@ -146,7 +306,7 @@ class GeminiAgent:
                                         }
                                     }
                                     print(f"DEBUG: Sending Tool Response: {json.dumps(tool_response)[:200]}...")
-                                    await self.gemini_ws.send(json.dumps(tool_response))
+                                    await self.send_upstream(ws, json.dumps(tool_response))
                                     
                                 elif "executableCode" in part:
                                     print("DEBUG: Received executableCode (Unexpected)")
@@ -163,7 +323,7 @@ class GeminiAgent:
                                 print(f"DEBUG: Gemini requested tool (Top-Level): {name}")
                                 print(f"DEBUG: Tool Args: {args}")
                                 
-                                result = await execute_tool(name, args)
+                                result = await self.run_tool(name, args)
                                 print(f"DEBUG: Tool Execution Result: {result}")
                                 
                                 # Send Tool Response Back
@@ -181,12 +341,12 @@ class GeminiAgent:
                                     }
                                 }
                                 print(f"DEBUG: Sending Tool Response: {json.dumps(tool_response)[:200]}...")
-                                await self.gemini_ws.send(json.dumps(tool_response))
+                                await self.send_upstream(ws, json.dumps(tool_response))
 
                     # Forward to Client (Audio/Text)
                     # Use try/except to handle case where client disconnected mid-process
                     try:
-                        await self.client_ws.send_json(response)
+                        await self.send_to_client(response)
                     except RuntimeError:
                          print("Client websocket closed/completed. stopping loop.")
                          break
@@ -202,7 +362,96 @@ class GeminiAgent:
             print(f"Error receiving from Gemini: {e}")
             import traceback
             traceback.print_exc()
+        finally:
+            # Upstream went away (idle reap, server close) or the client did:
+            # forget the socket so it is reopened lazily, and make sure it is
+            # closed, since close_upstream() can no longer reach it
+            if self.gemini_ws is ws:
+                self.gemini_ws = None
+            await ws.close()
+
+    async def run_tool(self, name: str, args: dict):
+        started = time.monotonic()
+        result = await execute_tool(name, args, user_id=self.user_id)
+        if self.recorder:
+            self.recorder.record(recorder.TOOL_CALL, json.dumps({
+                "name": name, "args": args, "result": result,
+                "duration_ms": round((time.monotonic() - started) * 1000, 2),
+            }, default=str))
+        return result
+
+    async def send_upstream(self, ws, text: str):
+        self.counters["upstream_out_bytes"] += len(text)
+        if self.recorder:
+            self.recorder.record(recorder.UPSTREAM_OUT, text)
+        await ws.send(text)
+
+    async def send_json_to_client(self, data: dict):
+        # Same encoding as WebSocket.send_json, but we need the size
+        text = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+        self.counters["client_out_bytes"] += len(text)
+        if self.recorder:
+            self.recorder.record(recorder.CLIENT_OUT_TEXT, text)
+        await self.client_ws.send_text(text)
+
+    async def send_to_client(self, response: dict):
+        if self.audio_codec is None:
+            await self.send_json_to_client(response)
+            return
+
+        # Binary mode: audio as binary frames, whatever is left as a small JSON frame
+        pcm_chunks, remainder = split_audio(response)
+        for pcm in pcm_chunks:
+            frame = encode_frame(pcm, self.audio_codec)
+            self.counters["client_out_bytes"] += len(frame)
+            if self.recorder:
+                self.recorder.record(recorder.CLIENT_OUT_BINARY, frame)
+            await self.client_ws.send_bytes(frame)
+        if remainder is not None:
+            await self.send_json_to_client(remainder)
+
+    def snapshot(self) -> dict:
+        """Point-in-time view of this session for diagnostics."""
+        def task_state(task):
+            if task is None:
+                return None
+            if not task.done():
+                return "running"
+            return "cancelled" if task.cancelled() else "done"
+
+        upstream = None
+        ws = self.gemini_ws
+        if ws is not None:
+            transport = getattr(ws, "transport", None)
+            # Received-but-unread frames: `recv_messages.frames` in the asyncio
+            # implementation of websockets, `messages` in the legacy one
+            recv_messages = getattr(ws, "recv_messages", None)
+            pending = getattr(recv_messages, "frames", None)
+            if pending is None:
+                pending = getattr(ws, "messages", ())
+            upstream = {
+                "write_buffer_bytes": transport.get_write_buffer_size() if transport else None,
+                "recv_queue": len(pending),
+            }
+
+        return {
+            "id": id(self),
+            "user_id": self.user_id,
+            "age_s": round(time.time() - self.started_at, 1),
+            "idle_s": round(time.monotonic() - self.last_activity, 1),
+            "audio_codec": self.audio_codec,
+            "upstream": upstream,
+            "tasks": {
+                "receive_from_gemini": task_state(self.gemini_task),
+                "idle_watchdog": task_state(self.watchdog_task),
+            },
+            **self.counters,
+        }
 
     async def close(self):
-        if self.gemini_ws:
-            await self.gemini_ws.close()
+        self.closed = True
+        await self.close_upstream()
+        if self.gemini_task:
+            self.gemini_task.cancel()
+        if self.recorder:
+            self.recorder.close()
@@ -0,0 +1,77 @@
+import os
+import time
+from collections import deque
+
+# Connection Registry
+# Live /ws/audio sockets indexed by user id, then device id, so a notification
+# costs O(that user's sockets) instead of O(every connected socket).
+# Users with no live socket get a small pending queue, flushed on reconnect.
+# Entries older than PENDING_TTL are dropped, and so are queues left empty.
+#
+# Not a privacy boundary: until there is sign-in, user_id is whatever the
+# client claims, so anyone can receive another user's notifications, live or
+# queued, by claiming their id.
+
+PENDING_LIMIT = int(os.getenv("PENDING_NOTIFICATIONS_LIMIT", "10"))
+PENDING_TTL = float(os.getenv("PENDING_NOTIFICATIONS_TTL", "3600"))  # seconds
+
+class ConnectionRegistry:
+    def __init__(self, pending_limit: int = PENDING_LIMIT, pending_ttl: float = PENDING_TTL):
+        self.pending_limit = pending_limit
+        self.pending_ttl = pending_ttl
+        self._by_user = {}  # user_id -> {device_id: WebSocket}
+        self._pending = {}  # user_id -> deque[(queued_at, message)]
+
+    async def add(self, user_id: str, device_id: str, ws):
+        """Register a socket (replacing that device's previous one) and flush pending notifications."""
+        self._by_user.setdefault(user_id, {})[device_id] = ws
+
+        pending = self._pending.pop(user_id, None)
+        if pending:
+            now = time.time()
+            for queued_at, message in pending:
+                if now - queued_at <= self.pending_ttl:
+                    await self.notify(user_id, message)
+
+    def remove(self, user_id: str, device_id: str, ws):
+        devices = self._by_user.get(user_id)
+        # A reconnect from the same device may already have replaced this socket
+        if devices and devices.get(device_id) is ws:
+            del devices[device_id]
+            if not devices:
+                del self._by_user[user_id]
+
+    async def notify(self, user_id: str, message: dict) -> int:
+        """Send to every socket of `user_id`; queue it if none took it. Returns sockets reached."""
+        delivered = 0
+        for ws in list(self._by_user.get(user_id, {}).values()):
+            try:
+                await ws.send_json(message)
+                delivered += 1
+            except Exception:
+                pass  # Socket is closing; its endpoint will remove it
+
+        self._expire_pending()
+        if not delivered:
+            queue = self._pending.get(user_id)
+            if queue is None:
+                queue = self._pending[user_id] = deque(maxlen=self.pending_limit)
+            queue.append((time.time(), message))
+        return delivered
+
+    def _expire_pending(self):
+        # Oldest entries are at the left of each queue
+        cutoff = time.time() - self.pending_ttl
+        for user_id, queue in list(self._pending.items()):
+            while queue and queue[0][0] < cutoff:
+                queue.popleft()
+            if not queue:
+                del self._pending[user_id]
+
+    def stats(self) -> dict:
+        self._expire_pending()
+        return {
+            "users": len(self._by_user),
+            "sockets": sum(len(d) for d in self._by_user.values()),
+            "users_with_pending": len(self._pending),
+        }
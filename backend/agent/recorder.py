@@ -0,0 +1,88 @@
+import os
+import struct
+import time
+
+# Session Recorder
+# Opt-in (RECORD_SESSIONS_DIR): writes both directions of a /ws/audio session
+# to an append-only binary log, one file per session. Payloads are the exact
+# bytes that crossed the socket; nothing is re-encoded.
+#
+# File layout:
+#   MAGIC
+#   frame*   where frame = <u32 length> <f64 offset_s> <u8 kind> <payload>
+#            length counts offset + kind + payload; offset is seconds since
+#            the session started.
+#
+# Replay with replay_session.py.
+
+MAGIC = b"PULUREC1"
+
+# Frame kinds
+META = 0                # JSON: session settings (written once, first)
+CLIENT_IN = 1           # Browser -> server text
+CLIENT_OUT_TEXT = 2     # Server -> browser text
+CLIENT_OUT_BINARY = 3   # Server -> browser binary audio frame
+UPSTREAM_IN = 4         # Gemini -> server
+UPSTREAM_OUT = 5        # Server -> Gemini (setup, realtime_input, toolResponse)
+UPSTREAM_OPEN = 6       # Upstream socket (re)opened, empty payload
+TOOL_CALL = 7           # JSON: {"name", "args", "result", "duration_ms"}
+CLIENT_IN_BINARY = 8    # Browser -> server binary PCM16 mic frame
+
+KIND_NAMES = {
+    META: "meta", CLIENT_IN: "client_in", CLIENT_OUT_TEXT: "client_out_text",
+    CLIENT_OUT_BINARY: "client_out_binary", UPSTREAM_IN: "upstream_in",
+    UPSTREAM_OUT: "upstream_out", UPSTREAM_OPEN: "upstream_open", TOOL_CALL: "tool_call",
+    CLIENT_IN_BINARY: "client_in_binary",
+}
+
+_HEADER = struct.Struct("<IdB")
+_LENGTH = struct.Struct("<I")
+_BODY = struct.Struct("<dB")
+
+RECORD_SESSIONS_DIR = os.getenv("RECORD_SESSIONS_DIR")
+
+class SessionRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self.started = time.monotonic()
+        # Buffered: most records are a memcpy into the buffer, not a syscall
+        self._file = open(path, "ab", buffering=1 << 16)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def record(self, kind: int, payload=b""):
+        if self._file.closed:
+            return  # Session already closed; late frames from a draining task
+        if isinstance(payload, str):
+            payload = payload.encode()
+        offset = time.monotonic() - self.started
+        self._file.write(_HEADER.pack(len(payload) + _BODY.size, offset, kind))
+        self._file.write(payload)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+def open_session_recorder(session_id: str):
+    """Recorder for a new session, or None when recording is off."""
+    if not RECORD_SESSIONS_DIR:
+        return None
+    os.makedirs(RECORD_SESSIONS_DIR, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{session_id}.rec"
+    return SessionRecorder(os.path.join(RECORD_SESSIONS_DIR, name))
+
+def read_frames(path: str):
+    """Yield (offset_s, kind, payload_bytes). A truncated last frame is ignored."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session recording")
+        while True:
+            prefix = f.read(4)
+            if len(prefix) < 4:
+                return
+            (length,) = _LENGTH.unpack(prefix)
+            body = f.read(length)
+            if len(body) < length:
+                return
+            offset, kind = _BODY.unpack_from(body)
+            yield offset, kind, body[_BODY.size:]
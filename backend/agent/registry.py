@@ -0,0 +1,218 @@
+import asyncio
+import time
+import traceback
+
+# Declarative Tool Registry
+# Each tool declares its Gemini schema once. That schema:
+#   - goes into the `function_declarations` sent in the setup message, and
+#   - is compiled into an argument validator when the tool is registered.
+# Each call runs under the tool's own deadline, concurrency limit and circuit
+# breaker, so a hung or failing storage backend cannot stall the model's turn.
+
+class ToolArgumentError(ValueError):
+    pass
+
+# Errors that say the storage backend is unhealthy, so they count towards the
+# circuit breaker. Anything else is a bug in the handler (or in the data it
+# read) and is reported as such, without taking the tool down for everyone.
+try:
+    from google.api_core.exceptions import GoogleAPIError
+    BACKEND_ERRORS = (OSError, GoogleAPIError)
+except ImportError:
+    BACKEND_ERRORS = (OSError,)
+
+# --- Validator Compilation ---
+
+def compile_validator(schema: dict, path: str = "args"):
+    """Turn a Gemini (OpenAPI-subset) schema into a function value -> value."""
+    kind = schema.get("type", "OBJECT")
+    enum = set(schema["enum"]) if "enum" in schema else None
+
+    if kind == "OBJECT":
+        fields = {name: compile_validator(sub, f"{path}.{name}") for name, sub in schema.get("properties", {}).items()}
+        required = tuple(schema.get("required", ()))
+
+        def check_object(value):
+            if value is None:
+                value = {}
+            if not isinstance(value, dict):
+                raise ToolArgumentError(f"{path} must be an object")
+            for name in required:
+                if value.get(name) is None:
+                    raise ToolArgumentError(f"{path}.{name} is required")
+            unknown = value.keys() - fields.keys()
+            if unknown:
+                raise ToolArgumentError(f"{path} has unknown field(s): {', '.join(sorted(unknown))}")
+            return {name: (fields[name](v) if v is not None else None) for name, v in value.items()}
+        return check_object
+
+    if kind == "ARRAY":
+        item = compile_validator(schema.get("items", {"type": "STRING"}), f"{path}[]")
+
+        def check_array(value):
+            if not isinstance(value, list):
+                raise ToolArgumentError(f"{path} must be a list")
+            return [item(v) for v in value]
+        return check_array
+
+    if kind == "STRING":
+        def check_string(value):
+            if not isinstance(value, str):
+                raise ToolArgumentError(f"{path} must be a string")
+            if enum is not None and value not in enum:
+                raise ToolArgumentError(f"{path} must be one of {', '.join(sorted(enum))}")
+            return value
+        return check_string
+
+    if kind == "INTEGER":
+        def check_integer(value):
+            # JSON numbers can come back as 300.0; accept integral floats
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+                raise ToolArgumentError(f"{path} must be an integer")
+            return int(value)
+        return check_integer
+
+    if kind == "NUMBER":
+        def check_number(value):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ToolArgumentError(f"{path} must be a number")
+            return value
+        return check_number
+
+    if kind == "BOOLEAN":
+        def check_boolean(value):
+            if not isinstance(value, bool):
+                raise ToolArgumentError(f"{path} must be true or false")
+            return value
+        return check_boolean
+
+    raise ValueError(f"Unsupported schema type at {path}: {kind}")
+
+# --- Circuit Breaker ---
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures; while open, calls are refused
+    until `cooldown` seconds have passed, then one trial call is let through.
+    """
+
+    def __init__(self, threshold: int = 3, cooldown: float = 30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_cancelled(self):
+        # Outcome says nothing about the backend (cancelled, or a handler bug)
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+# --- Registry ---
+
+class Tool:
+    def __init__(self, name, description, parameters, handler, timeout, max_concurrency, fallback, breaker):
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.handler = handler
+        self.timeout = timeout
+        self.fallback = fallback
+        self.validate = compile_validator(parameters)
+        self.limit = asyncio.Semaphore(max_concurrency)
+        self.breaker = breaker
+
+    @property
+    def declaration(self) -> dict:
+        return {"name": self.name, "description": self.description, "parameters": self.parameters}
+
+class ToolRegistry:
+    def __init__(self):
+        self.tools = {}
+
+    def tool(self, name: str, description: str, parameters: dict, timeout: float = 5, max_concurrency: int = 4,
+             fallback: str = None, breaker_threshold: int = 3, breaker_cooldown: float = 30):
+        """Decorator registering `async def handler(args, **context) -> str` as a tool."""
+        def register(handler):
+            self.tools[name] = Tool(
+                name, description, parameters, handler, timeout, max_concurrency,
+                fallback or f"{name} is temporarily unavailable. Please try again in a moment.",
+                CircuitBreaker(breaker_threshold, breaker_cooldown),
+            )
+            return handler
+        return register
+
+    def declarations(self) -> list:
+        return [t.declaration for t in self.tools.values()]
+
+    async def execute(self, name: str, args: dict, **context):
+        """Run a tool; `context` (e.g. user_id) is passed through to the handler."""
+        tool = self.tools.get(name)
+        if tool is None:
+            return "Tool not found"
+
+        try:
+            args = tool.validate(args)
+        except ToolArgumentError as e:
+            return f"Error: {e}."
+
+        # Degraded backend: answer immediately instead of queueing more work
+        if not tool.breaker.allow():
+            print(f"DEBUG: Circuit open for {name}, returning fallback", flush=True)
+            return tool.fallback
+
+        async def run():
+            async with tool.limit:
+                return await tool.handler(args, **context)
+
+        try:
+            # The deadline covers waiting for a concurrency slot as well
+            result = await asyncio.wait_for(run(), tool.timeout)
+        except asyncio.CancelledError:
+            # Session went away mid-call: not the backend's fault
+            tool.breaker.record_cancelled()
+            raise
+        except asyncio.TimeoutError:
+            print(f"Tool {name} timed out after {tool.timeout}s", flush=True)
+            tool.breaker.record_failure()
+            return tool.fallback
+        except BACKEND_ERRORS as e:
+            print(f"Tool {name} failed: {e}", flush=True)
+            tool.breaker.record_failure()
+            return tool.fallback
+        except Exception as e:
+            # Handler bug: show it to the model and the logs, leave the breaker alone
+            print(f"Tool {name} raised:", flush=True)
+            traceback.print_exc()
+            tool.breaker.record_cancelled()
+            return f"Error: {name} failed ({type(e).__name__}: {e})."
+
+        tool.breaker.record_success()
+        return result
@@ -1,8 +1,9 @@
 import asyncio
 from datetime import datetime, timezone
 import db
+from .tools import next_occurrence
 
-async def check_alarms(active_sockets):
+async def check_alarms(connections):
     print("Background Scheduler Started (Firestore Mode)", flush=True)
     
     while True:
@@ -23,14 +24,17 @@ async def check_alarms(active_sockets):
                 else:
                     alarm_time = alarm_time.astimezone(timezone.utc)
                 
-                if alarm["status"] == "ACTIVE" and alarm_time <= now:
+                # Recurring alarms ring again at their next occurrence even if the
+                # last ring was never dismissed
+                recurrence = alarm.get("recurrence")
+                if (alarm["status"] == "ACTIVE" or recurrence) and alarm_time <= now:
                     print(f"DEBUG: ALARM RINGING! ID={alarm['id']} Label={alarm['label']}", flush=True)
-                    await db.update_alarm(alarm["id"], {"status": "RINGING"})
+                    next_time = next_occurrence(recurrence, now) if recurrence else None
+                    await db.fire_alarm(alarm["id"], next_time)
                     
-                    for ws in active_sockets:
-                        try:
-                            await ws.send_json({"type": "notification", "text": f"ALARM: {alarm['label']}"})
-                        except: pass
+                    # Only the owner's sockets (queued if they are offline)
+                    owner = alarm.get("user_id", db.DEFAULT_USER_ID)
+                    await connections.notify(owner, {"type": "notification", "text": f"ALARM: {alarm['label']}"})
 
             # 2. Check Timers
             timers = await db.get_active_timers()
@@ -46,10 +50,8 @@ async def check_alarms(active_sockets):
                     print(f"DEBUG: TIMER RINGING! ID={timer['id']} Label={timer['label']}", flush=True)
                     await db.update_timer(timer["id"], {"status": "RINGING"})
                     
-                    for ws in active_sockets:
-                        try:
-                            await ws.send_json({"type": "notification", "text": f"TIMER: {timer['label']}"})
-                        except: pass
+                    owner = timer.get("user_id", db.DEFAULT_USER_ID)
+                    await connections.notify(owner, {"type": "notification", "text": f"TIMER: {timer['label']}"})
 
         except Exception as e:
             print(f"Scheduler Error: {e}", flush=True)
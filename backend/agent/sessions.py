@@ -0,0 +1,109 @@
+import asyncio
+import os
+import time
+
+# Session Manager for /ws/audio
+# - Admission control: at most MAX_SESSIONS live sessions. When full, a new
+#   connection waits up to SESSION_QUEUE_TIMEOUT seconds for a slot, then is
+#   rejected (0 = reject immediately).
+# - Idle reaping: each GeminiAgent closes its upstream socket after
+#   SESSION_IDLE_TIMEOUT seconds without speech (see GeminiAgent.idle_watchdog).
+#   An open mic keeps streaming silence, so only mic frames whose RMS level
+#   reaches SESSION_ACTIVITY_RMS count as activity.
+# - Graceful drain: on SIGTERM new sessions are refused and live ones are
+#   closed cleanly, upstream first, within SHUTDOWN_DRAIN_TIMEOUT seconds.
+
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "20"))  # 0 = unlimited
+SESSION_QUEUE_TIMEOUT = float(os.getenv("SESSION_QUEUE_TIMEOUT", "0"))
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "120"))  # 0 = never
+SESSION_ACTIVITY_RMS = float(os.getenv("SESSION_ACTIVITY_RMS", "300"))  # PCM16 RMS; 0 = any frame
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "8"))
+
+# WebSocket close codes
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_SERVICE_RESTART = 1012
+CLOSE_INTERNAL_ERROR = 1011
+
+class SessionManager:
+    def __init__(self, max_sessions: int = MAX_SESSIONS, queue_timeout: float = SESSION_QUEUE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.queue_timeout = queue_timeout
+        self.sessions = set()  # Live GeminiAgent instances
+        self.draining = False
+        self._slots = asyncio.Semaphore(max_sessions) if max_sessions else None
+        self._waiting = 0
+        self._drain_task = None
+
+    async def acquire(self) -> bool:
+        """Reserve a session slot. Returns False if the caller should be rejected."""
+        if self.draining:
+            return False
+        if self._slots is None:
+            return True
+        if not self._slots.locked():
+            await self._slots.acquire()
+            return True
+        if self.queue_timeout <= 0:
+            return False
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiting -= 1
+
+        if self.draining:
+            self._slots.release()
+            return False
+        return True
+
+    def release(self):
+        if self._slots is not None:
+            self._slots.release()
+
+    def add(self, agent):
+        self.sessions.add(agent)
+
+    def remove(self, agent):
+        self.sessions.discard(agent)
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self.sessions),
+            "waiting": self._waiting,
+            "max": self.max_sessions,
+            "draining": self.draining,
+        }
+
+    def drain(self, timeout: float = SHUTDOWN_DRAIN_TIMEOUT) -> asyncio.Task:
+        """
+        Refuse new sessions and close live ones, waiting up to `timeout` seconds.
+        Safe to call more than once; every caller awaits the same drain.
+        """
+        if self._drain_task is None:
+            self.draining = True
+            self._drain_task = asyncio.ensure_future(self._drain(timeout))
+        return self._drain_task
+
+    async def _drain(self, timeout: float):
+        print(f"Draining {len(self.sessions)} session(s)...", flush=True)
+        deadline = time.monotonic() + timeout
+
+        # Concurrently: each upstream close may wait out a slow close handshake,
+        # and all of them together must fit in `timeout`
+        closing = [asyncio.ensure_future(self._close_session(agent)) for agent in list(self.sessions)]
+        if closing:
+            await asyncio.wait(closing, timeout=timeout)
+
+        while self.sessions and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        print(f"Drain finished, {len(self.sessions)} session(s) left", flush=True)
+
+    async def _close_session(self, agent):
+        try:
+            await agent.close()
+            await agent.client_ws.close(code=CLOSE_SERVICE_RESTART)
+        except Exception as e:
+            print(f"Error closing session: {e}", flush=True)
@@ -5,6 +5,7 @@ try:
 except ImportError:
     from backports.zoneinfo import ZoneInfo
 import db 
+from .registry import ToolRegistry
 
 # --- Helper Functions ---
 
@@ -64,75 +65,88 @@ def parse_time_string(time_str: str, user_timezone: str = "UTC") -> datetime:
     # 4. Convert to UTC for Storage
     return local_dt.astimezone(ZoneInfo("UTC"))
 
-# --- Tool Definitions ---
+# --- Recurrence ---
+# A recurring alarm stores only its NEXT occurrence in `time`, plus a
+# `recurrence` map describing the rule:
+#   {"repeat": "daily" | "weekdays" | "weekly", "days": [0..6 (Mon=0)],
+#    "local_time": "HH:MM", "timezone": "America/Los_Angeles"}
+#   {"repeat": "hourly", "interval_hours": N, "anchor": <UTC datetime>}
+# `time` is advanced with next_occurrence() when the alarm fires, so each alarm
+# stays one document however far ahead the schedule runs.
 
-DEFINITIONS = [
-    {"google_search": {}},
-    {
-        "function_declarations": [
-            {
-                "name": "handle_alarm",
-                "description": "Create, read, or delete alarms. To DELETE cancellation of a specific alarm, provide 'time' or 'alarm_id'.",
-                "parameters": {
-                    "type": "OBJECT",
-                    "properties": {
-                        "action": {"type": "STRING", "enum": ["create", "read", "delete"]},
-                        "time": {"type": "STRING", "description": "Natural language time (e.g. '7am', 'tomorrow noon')"},
-                        "label": {"type": "STRING", "description": "Name of the alarm"},
-                        "alarm_id": {"type": "STRING", "description": "ID of alarm to delete"}
-                    },
-                    "required": ["action"]
-                }
-            },
-            {
-                "name": "handle_timer",
-                "description": "Set a timer for a duration.",
-                "parameters": {
-                    "type": "OBJECT",
-                    "properties": {
-                        "action": {"type": "STRING", "enum": ["create", "read", "delete"]},
-                        "duration": {"type": "INTEGER", "description": "Duration in seconds"},
-                        "label": {"type": "STRING"},
-                        "timer_id": {"type": "STRING"}
-                    },
-                    "required": ["action"]
-                }
-            },
-            {
-                "name": "update_profile",
-                "description": "Update user profile details.",
-                "parameters": {
-                    "type": "OBJECT",
-                    "properties": {
-                        "name": {"type": "STRING"},
-                        "city": {"type": "STRING"},
-                        "timezone": {"type": "STRING"},
-                        "gender": {"type": "STRING"}
-                    }
-                }
-            },
-            {
-                "name": "manage_memory",
-                "description": "Remember or forget facts.",
-                "parameters": {
-                    "type": "OBJECT",
-                    "properties": {
-                        "action": {"type": "STRING", "enum": ["add", "delete"]},
-                        "key": {"type": "STRING"},
-                        "value": {"type": "STRING"}
-                    },
-                    "required": ["action", "key"]
-                }
-            }
-        ]
-    }
-]
+WEEKDAY_NAMES = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+def build_recurrence(repeat: str, args: dict, first_utc: datetime, user_timezone: str) -> dict:
+    """Build the stored recurrence rule; raises ValueError on bad input."""
+    if repeat == "hourly":
+        interval = int(args.get("interval_hours") or 0)
+        if interval < 1:
+            raise ValueError("interval_hours must be at least 1")
+        return {"repeat": "hourly", "interval_hours": interval, "anchor": first_utc}
+
+    if repeat == "daily":
+        days = list(range(7))
+    elif repeat == "weekdays":
+        days = list(range(5))
+    elif repeat == "weekly":
+        try:
+            days = sorted({WEEKDAY_NAMES.index(d.lower().strip()) for d in args.get("days") or []})
+        except ValueError:
+            raise ValueError("Unknown day name")
+        if not days:
+            raise ValueError("days required for weekly alarms")
+    else:
+        raise ValueError(f"Unknown repeat: {repeat}")
+
+    local = first_utc.astimezone(ZoneInfo(user_timezone))
+    return {"repeat": repeat, "days": days, "local_time": local.strftime("%H:%M"), "timezone": user_timezone}
+
+def next_occurrence(recurrence: dict, after_utc: datetime) -> datetime:
+    """
+    First occurrence strictly after `after_utc`, in UTC. Constant work: missed
+    occurrences (e.g. server was down) are skipped, not replayed.
+    """
+    utc = ZoneInfo("UTC")
+
+    if recurrence["repeat"] == "hourly":
+        # Absolute hours, so a DST change does not stretch or shrink the interval
+        step = timedelta(hours=recurrence["interval_hours"])
+        anchor = recurrence["anchor"]
+        if anchor.tzinfo is None:
+            anchor = anchor.replace(tzinfo=utc)
+        if after_utc < anchor:
+            return anchor.astimezone(utc)
+        steps = (after_utc - anchor) // step + 1
+        return (anchor + steps * step).astimezone(utc)
+
+    # Wall-clock rules: combine the local date with HH:MM in the alarm's zone.
+    # ZoneInfo resolves DST edges: a time skipped by spring-forward lands one hour
+    # later, and a repeated fall-back time rings once (first occurrence, fold=0).
+    tz = ZoneInfo(recurrence["timezone"])
+    hour, minute = map(int, recurrence["local_time"].split(":"))
+    start_date = after_utc.astimezone(tz).date()
+    for offset in range(8):
+        day = start_date + timedelta(days=offset)
+        if day.weekday() not in recurrence["days"]:
+            continue
+        candidate = datetime.combine(day, time(hour, minute)).replace(tzinfo=tz).astimezone(utc)
+        if candidate > after_utc:
+            return candidate
+    raise ValueError("Recurrence has no valid days")
+
+def describe_recurrence(recurrence: dict) -> str:
+    repeat = recurrence["repeat"]
+    if repeat == "hourly":
+        return f"every {recurrence['interval_hours']} hour(s)"
+    if repeat == "weekly":
+        return "every " + ", ".join(WEEKDAY_NAMES[d].capitalize() for d in recurrence["days"])
+    return repeat
 
 # --- Execution Logic ---
 
-async def handle_alarm_logic(action: str, args: dict):
+async def handle_alarm_logic(action: str, args: dict, user_id: str = db.DEFAULT_USER_ID):
     # 1. Fetch Profile for Timezone Context
-    profile = await db.get_user_profile("user_1")
+    profile = await db.get_user_profile(user_id)
     user_tz_str = profile.get("timezone", "UTC")
     try:
         user_tz = ZoneInfo(user_tz_str)
@@ -141,26 +155,42 @@ async def handle_alarm_logic(action: str, args: dict):
 
     if action == "create":
         time_str = args.get("time")
-        if not time_str: return "Error: Time required."
+        repeat = args.get("repeat") or "none"
+        if not time_str and repeat != "hourly": return "Error: Time required."
         try:
+            now_utc = datetime.now(ZoneInfo("UTC"))
             # Parse logic handles the conversion to UTC
-            alarm_dt_utc = parse_time_string(time_str, user_tz_str)
-            
-            await db.create_alarm({
+            if time_str:
+                alarm_dt_utc = parse_time_string(time_str, user_tz_str)
+            else:
+                alarm_dt_utc = now_utc + timedelta(hours=int(args.get("interval_hours") or 0))
+
+            alarm = {
                 "time": alarm_dt_utc, 
                 "label": args.get("label", "Alarm"),
                 "status": "ACTIVE",
-                "created_at": datetime.now(ZoneInfo("UTC"))
-            })
+                "user_id": user_id,
+                "created_at": now_utc
+            }
+            if repeat != "none":
+                alarm["recurrence"] = build_recurrence(repeat, args, alarm_dt_utc, user_tz.key)
+                # e.g. "weekdays 7am" said on a Saturday -> first ring is Monday
+                alarm["time"] = next_occurrence(alarm["recurrence"], now_utc)
+
+            await db.create_alarm(alarm)
             
             # Confirm back to user in THEIR time
-            local_display = alarm_dt_utc.astimezone(user_tz).strftime("%I:%M %p")
+            local_display = alarm["time"].astimezone(user_tz).strftime("%a %I:%M %p")
+            if "recurrence" in alarm:
+                return f"Alarm set {describe_recurrence(alarm['recurrence'])}, next at {local_display}."
             return f"Alarm set for {local_display}."
-        except ValueError:
+        except ValueError as e:
+            if repeat != "none" and str(e) != "Could not parse time":
+                return f"Error: {e}."
             return "Could not understand the time."
 
     elif action == "read":
-        alarms = await db.get_active_alarms()
+        alarms = await db.get_active_alarms(user_id)
         if not alarms: return "No active alarms."
         
         # Convert UTC -> User Timezone for display
@@ -175,6 +205,8 @@ async def handle_alarm_logic(action: str, args: dict):
             local_time = utc_time.astimezone(user_tz)
             time_str = local_time.strftime("%I:%M %p") # e.g. "07:00 AM"
             
+            if a.get("recurrence"):
+                time_str = f"{local_time.strftime('%a')} {time_str}, repeats {describe_recurrence(a['recurrence'])}"
             output.append(f"[{a['id']}] {a.get('label','Alarm')} at {time_str}")
             
         return "Current Alarms:\n" + "\n".join(output)
@@ -186,8 +218,15 @@ async def handle_alarm_logic(action: str, args: dict):
         if not alarm_id and args.get("time"):
             try:
                 target_dt_utc = parse_time_string(args.get("time"), user_tz_str)
-                alarms = await db.get_active_alarms()
+                alarms = await db.get_active_alarms(user_id)
+                target_local = target_dt_utc.astimezone(user_tz).strftime("%H:%M")
                 for a in alarms:
+                    # Recurring: match the time of day, the next ring may be on another day
+                    rec = a.get("recurrence")
+                    if rec and rec.get("local_time") == target_local:
+                        alarm_id = a["id"]
+                        break
+
                     # Match within 60s
                     utc_time = a['time']
                     if utc_time.tzinfo is None: utc_time = utc_time.replace(tzinfo=ZoneInfo("UTC"))
@@ -208,11 +247,15 @@ async def handle_alarm_logic(action: str, args: dict):
              if args.get("time"):
                  return f"No alarm found at {args.get('time')}."
 
-             alarms = await db.get_active_alarms()
+             alarms = await db.get_active_alarms(user_id)
              count = 0
              for a in alarms:
                  if a.get("status") == "RINGING":
-                     await db.delete_alarm(a["id"])
+                     if a.get("recurrence"):
+                         # Dismiss only this ring; `time` already holds the next occurrence
+                         await db.update_alarm(a["id"], {"status": "ACTIVE"})
+                     else:
+                         await db.delete_alarm(a["id"])
                      count += 1
              
              if count > 0:
@@ -222,9 +265,9 @@ async def handle_alarm_logic(action: str, args: dict):
         await db.delete_alarm(alarm_id)
         return "Alarm deleted."
 
-async def handle_timer_logic(action: str, args: dict):
+async def handle_timer_logic(action: str, args: dict, user_id: str = db.DEFAULT_USER_ID):
     # Timers are relative, so timezone matters less, but end_time is absolute
-    profile = await db.get_user_profile("user_1")
+    profile = await db.get_user_profile(user_id)
     user_tz_str = profile.get("timezone", "UTC")
     try:
         user_tz = ZoneInfo(user_tz_str)
@@ -242,12 +285,13 @@ async def handle_timer_logic(action: str, args: dict):
             "end_time": end_time_utc,
             "label": args.get("label", "Timer"),
             "status": "ACTIVE",
+            "user_id": user_id,
             "created_at": datetime.now(ZoneInfo("UTC"))
         })
         return f"Timer set for {duration} seconds."
 
     elif action == "read":
-        timers = await db.get_active_timers()
+        timers = await db.get_active_timers(user_id)
         if not timers: return "No active timers."
         
         output = []
@@ -267,7 +311,7 @@ async def handle_timer_logic(action: str, args: dict):
     elif action == "delete":
         timer_id = args.get("timer_id")
         if not timer_id:
-             timers = await db.get_active_timers()
+             timers = await db.get_active_timers(user_id)
              count = 0
              for t in timers:
                  if t.get("status") == "RINGING":
@@ -280,21 +324,97 @@ async def handle_timer_logic(action: str, args: dict):
         await db.delete_timer(timer_id)
         return "Timer deleted."
 
+# --- Tool Registry ---
+# Schema, validator, deadline, concurrency limit and circuit breaker are all
+# declared here, once per tool. DEFINITIONS is generated from the registry.
+
+registry = ToolRegistry()
+
+@registry.tool(
+    name="handle_alarm",
+    description="Create, read, or delete alarms. To DELETE cancellation of a specific alarm, provide 'time' or 'alarm_id'. Deleting a recurring alarm by id or time cancels the whole series; stopping a ringing recurring alarm keeps it for its next occurrence.",
+    parameters={
+        "type": "OBJECT",
+        "properties": {
+            "action": {"type": "STRING", "enum": ["create", "read", "delete"]},
+            "time": {"type": "STRING", "description": "Natural language time (e.g. '7am', 'tomorrow noon')"},
+            "label": {"type": "STRING", "description": "Name of the alarm"},
+            "alarm_id": {"type": "STRING", "description": "ID of alarm to delete"},
+            "repeat": {"type": "STRING", "enum": ["none", "daily", "weekdays", "weekly", "hourly"], "description": "Recurrence. 'weekly' needs 'days', 'hourly' needs 'interval_hours'"},
+            "days": {"type": "ARRAY", "items": {"type": "STRING", "enum": WEEKDAY_NAMES}, "description": "Week days for repeat='weekly' (e.g. ['monday', 'thursday'])"},
+            "interval_hours": {"type": "INTEGER", "description": "Hours between rings for repeat='hourly'"}
+        },
+        "required": ["action"]
+    },
+    fallback="Alarms are temporarily unavailable. Please try again in a moment.",
+)
+async def handle_alarm(args: dict, user_id: str):
+    return await handle_alarm_logic(args.get("action"), args, user_id)
+
+@registry.tool(
+    name="handle_timer",
+    description="Set a timer for a duration.",
+    parameters={
+        "type": "OBJECT",
+        "properties": {
+            "action": {"type": "STRING", "enum": ["create", "read", "delete"]},
+            "duration": {"type": "INTEGER", "description": "Duration in seconds"},
+            "label": {"type": "STRING"},
+            "timer_id": {"type": "STRING"}
+        },
+        "required": ["action"]
+    },
+    fallback="Timers are temporarily unavailable. Please try again in a moment.",
+)
+async def handle_timer(args: dict, user_id: str):
+    return await handle_timer_logic(args.get("action"), args, user_id)
+
+@registry.tool(
+    name="update_profile",
+    description="Update user profile details.",
+    parameters={
+        "type": "OBJECT",
+        "properties": {
+            "name": {"type": "STRING"},
+            "city": {"type": "STRING"},
+            "timezone": {"type": "STRING"},
+            "gender": {"type": "STRING"}
+        }
+    },
+    fallback="Could not save the profile right now. Please try again in a moment.",
+)
+async def update_profile(args: dict, user_id: str):
+    await db.update_user_profile(user_id, args)
+    return "Profile updated."
+
+@registry.tool(
+    name="manage_memory",
+    description="Remember or forget facts.",
+    parameters={
+        "type": "OBJECT",
+        "properties": {
+            "action": {"type": "STRING", "enum": ["add", "delete"]},
+            "key": {"type": "STRING"},
+            "value": {"type": "STRING"}
+        },
+        "required": ["action", "key"]
+    },
+    fallback="Memory storage is temporarily unavailable. Please try again in a moment.",
+)
+async def manage_memory(args: dict, user_id: str):
+    action = args.get("action")
+    if action == "add":
+        await db.add_memory(user_id, args.get("key"), args.get("value"))
+        return "Fact stored."
+    elif action == "delete":
+        await db.delete_memory(user_id, args.get("key"))
+        return "Fact forgotten."
+
+DEFINITIONS = [
+    {"google_search": {}},
+    {"function_declarations": registry.declarations()}
+]
+
 # --- Main Executor ---
-async def execute_tool(name, args):
-    if name == "handle_alarm":
-        return await handle_alarm_logic(args.get("action"), args)
-    elif name == "handle_timer":
-        return await handle_timer_logic(args.get("action"), args)
-    elif name == "update_profile":
-        await db.update_user_profile("user_1", args)
-        return "Profile updated."
-    elif name == "manage_memory":
-        action = args.get("action")
-        if action == "add":
-            await db.add_memory("user_1", args.get("key"), args.get("value"))
-            return "Fact stored."
-        elif action == "delete":
-            await db.delete_memory("user_1", args.get("key"))
-            return "Fact forgotten."
-    return "Tool not found"
\ No newline at end of file
+async def execute_tool(name, args, user_id: str = db.DEFAULT_USER_ID):
+    return await registry.execute(name, args, user_id=user_id)
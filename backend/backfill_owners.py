@@ -0,0 +1,35 @@
+import argparse
+import asyncio
+
+import db
+
+# Owner Backfill (one-off)
+# Alarms and timers written before documents recorded a `user_id` are
+# invisible to per-user queries (db.get_active_alarms(user_id) filters on
+# user_id in Firestore). This assigns them to db.DEFAULT_USER_ID, their
+# implicit owner so far.
+#
+#   python backfill_owners.py            # dry run: count documents without an owner
+#   python backfill_owners.py --apply    # write user_id on them
+
+async def backfill(apply: bool):
+    client = db.get_client()
+    for collection in (db.ALARMS, db.TIMERS):
+        missing = 0
+        async for doc in client.collection(collection).stream():
+            if "user_id" in doc.to_dict():
+                continue
+            missing += 1
+            if apply:
+                await doc.reference.update({"user_id": db.DEFAULT_USER_ID})
+        action = f"set to {db.DEFAULT_USER_ID}" if apply else "dry run, use --apply to update"
+        print(f"{collection}: {missing} document(s) without user_id ({action})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Assign legacy alarms/timers to the default user")
+    parser.add_argument("--apply", action="store_true", help="Write the changes (default: dry run)")
+    args = parser.parse_args()
+    asyncio.run(backfill(args.apply))
+
+if __name__ == "__main__":
+    main()
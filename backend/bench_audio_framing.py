@@ -0,0 +1,101 @@
+import argparse
+import base64
+import json
+import time
+
+import numpy as np
+
+from agent.audio_codec import CODEC_MULAW, CODEC_PCM16, decode_frame, encode_frame, split_audio
+
+# Downstream audio framing benchmark.
+# Feeds synthetic Gemini audio messages through each /ws/audio downstream mode and
+# reports bytes on the wire per second of audio and server CPU per message.
+#
+#   python bench_audio_framing.py --seconds 60 --chunk-ms 40
+
+SAMPLE_RATE = 24000
+
+def synth_speech(seconds: float) -> np.ndarray:
+    """Voice-like test signal: a wandering fundamental with harmonics and noise."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = 140 + 40 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    signal = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 2.5 * t) ** 2
+    signal = signal * envelope + 0.02 * rng.standard_normal(len(t))
+    return (signal / np.abs(signal).max() * 12000).astype("<i2")
+
+def make_messages(samples: np.ndarray, chunk_ms: int):
+    step = SAMPLE_RATE * chunk_ms // 1000
+    for i in range(0, len(samples), step):
+        pcm = samples[i:i + step].tobytes()
+        yield {
+            "serverContent": {
+                "modelTurn": {
+                    "parts": [{"inlineData": {"mimeType": "audio/pcm;rate=24000", "data": base64.b64encode(pcm).decode()}}]
+                }
+            }
+        }
+
+def run_json(messages):
+    frames = []
+    for msg in messages:
+        frames.append(json.dumps(msg, separators=(",", ":")).encode())
+    return frames
+
+def run_binary(messages, codec):
+    frames = []
+    for msg in messages:
+        pcm_chunks, remainder = split_audio(msg)
+        for pcm in pcm_chunks:
+            frames.append(encode_frame(pcm, codec))
+        if remainder is not None:
+            frames.append(json.dumps(remainder, separators=(",", ":")).encode())
+    return frames
+
+def snr_db(reference: np.ndarray, decoded: np.ndarray) -> float:
+    ref = reference.astype(np.float64)
+    err = ref - decoded.astype(np.float64)
+    noise = np.sum(err ** 2)
+    if noise == 0:
+        return float("inf")
+    return 10 * np.log10(np.sum(ref ** 2) / noise)
+
+def main():
+    parser = argparse.ArgumentParser(description="Downstream audio framing benchmark")
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--chunk-ms", type=int, default=40)
+    args = parser.parse_args()
+
+    samples = synth_speech(args.seconds)
+    messages = list(make_messages(samples, args.chunk_ms))
+
+    modes = [
+        ("json", run_json),
+        ("pcm16", lambda m: run_binary(m, CODEC_PCM16)),
+        ("mulaw", lambda m: run_binary(m, CODEC_MULAW)),
+    ]
+
+    # Build the mu-law tables outside the timed region
+    run_binary(messages[:1], CODEC_MULAW)
+
+    print(f"{args.seconds:.0f}s of 24kHz audio in {len(messages)} messages of {args.chunk_ms}ms")
+    print(f"{'mode':<6} {'kB/s':>8} {'vs json':>8} {'us/msg':>8} {'SNR dB':>8}")
+    json_rate = None
+    for name, run in modes:
+        started = time.process_time()
+        frames = run(messages)
+        cpu = time.process_time() - started
+
+        rate = sum(len(f) for f in frames) / args.seconds / 1000
+        json_rate = json_rate or rate
+        if name == "json":
+            snr = float("inf")
+        else:
+            decoded = np.frombuffer(b"".join(decode_frame(f) for f in frames), dtype="<i2")
+            snr = snr_db(samples, decoded)
+        print(f"{name:<6} {rate:>8.1f} {rate / json_rate:>7.0%} {cpu / len(messages) * 1e6:>8.1f} {snr:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,23 @@
 import os
-from google.cloud import firestore
-from google.api_core.exceptions import NotFound
 from datetime import datetime
 
-# Initialize Firestore Client
+# Firestore Client (Lazy)
+# Importing the library and resolving credentials is slow and blocking, so it
+# is kept out of `import db`. main.lifespan builds the client in a worker
+# thread before the server starts listening; later calls just return it.
 # Automatically uses GOOGLE_APPLICATION_CREDENTIALS or Cloud Run identity
-db = firestore.AsyncClient()
+_client = None
+
+def get_client():
+    global _client
+    if _client is None:
+        from google.cloud import firestore
+        _client = firestore.AsyncClient()
+    return _client
+
+# Owner of documents created before alarms/timers recorded a user_id
+# (run backfill_owners.py once so per-user queries can see them)
+DEFAULT_USER_ID = "user_1"
 
 # Collection Names
 USERS = "users"
@@ -14,9 +26,9 @@ TIMERS = "timers"
 MEMORIES = "memories"
 
 # --- USER PROFILE ---
-async def get_user_profile(user_id: str = "user_1"):
+async def get_user_profile(user_id: str = DEFAULT_USER_ID):
     """Fetch user profile + memories"""
-    user_ref = db.collection(USERS).document(user_id)
+    user_ref = get_client().collection(USERS).document(user_id)
     doc = await user_ref.get()
     
     default_data = {
@@ -50,19 +62,29 @@ async def get_user_profile(user_id: str = "user_1"):
     return user_data
 
 async def update_user_profile(user_id: str, data: dict):
-    user_ref = db.collection(USERS).document(user_id)
+    user_ref = get_client().collection(USERS).document(user_id)
     # merge=True updates only the fields provided
     await user_ref.set(data, merge=True)
 
 # --- ALARMS ---
 async def create_alarm(data: dict):
-    # Data should include 'time' (datetime), 'label', 'status'
+    # Data should include 'time' (datetime), 'label', 'status', 'user_id'
     # Firestore usage: .add() returns (update_time, doc_ref)
-    await db.collection(ALARMS).add(data)
+    await get_client().collection(ALARMS).add(data)
 
-async def get_active_alarms():
-    # Filter for ACTIVE or RINGING
-    alarms_ref = db.collection(ALARMS).where("status", "in", ["ACTIVE", "RINGING"])
+def _active(collection: str, user_id: str = None):
+    # ACTIVE or RINGING, and owned by `user_id` unless it is None (scheduler).
+    # The owner filter runs in Firestore so a user's read only touches their
+    # own documents. If Firestore asks for a composite (user_id, status)
+    # index, the error message links to create it.
+    query = get_client().collection(collection).where("status", "in", ["ACTIVE", "RINGING"])
+    if user_id is not None:
+        query = query.where("user_id", "==", user_id)
+    return query
+
+async def get_active_alarms(user_id: str = None):
+    # Filter for ACTIVE or RINGING (and owner, if given)
+    alarms_ref = _active(ALARMS, user_id)
     
     results = []
     async for doc in alarms_ref.stream():
@@ -77,18 +99,26 @@ async def get_active_alarms():
     return results
 
 async def update_alarm(alarm_id: str, data: dict):
-    ref = db.collection(ALARMS).document(alarm_id)
+    ref = get_client().collection(ALARMS).document(alarm_id)
     await ref.update(data)
 
+async def fire_alarm(alarm_id: str, next_time: datetime = None):
+    # Mark RINGING. Recurring alarms move `time` to their next occurrence in the
+    # same write, so only one document per alarm is ever stored.
+    data = {"status": "RINGING"}
+    if next_time is not None:
+        data["time"] = next_time
+    await update_alarm(alarm_id, data)
+
 async def delete_alarm(alarm_id: str):
-    await db.collection(ALARMS).document(alarm_id).delete()
+    await get_client().collection(ALARMS).document(alarm_id).delete()
 
 # --- TIMERS ---
 async def create_timer(data: dict):
-    await db.collection(TIMERS).add(data)
+    await get_client().collection(TIMERS).add(data)
 
-async def get_active_timers():
-    ref = db.collection(TIMERS).where("status", "in", ["ACTIVE", "RINGING"])
+async def get_active_timers(user_id: str = None):
+    ref = _active(TIMERS, user_id)
     results = []
     async for doc in ref.stream():
         data = doc.to_dict()
@@ -98,19 +128,19 @@ async def get_active_timers():
     return results
 
 async def update_timer(timer_id: str, data: dict):
-    await db.collection(TIMERS).document(timer_id).update(data)
+    await get_client().collection(TIMERS).document(timer_id).update(data)
 
 async def delete_timer(timer_id: str):
-    await db.collection(TIMERS).document(timer_id).delete()
+    await get_client().collection(TIMERS).document(timer_id).delete()
 
 # --- MEMORIES ---
 async def add_memory(user_id: str, key: str, value: str):
     # Use 'key' as the document ID to prevent duplicates easily
     # Lowercase key for consistency
     safe_key = key.lower().strip().replace(" ", "_")
-    ref = db.collection(USERS).document(user_id).collection(MEMORIES).document(safe_key)
+    ref = get_client().collection(USERS).document(user_id).collection(MEMORIES).document(safe_key)
     await ref.set({"key": key, "value": value})
 
 async def delete_memory(user_id: str, key: str):
     safe_key = key.lower().strip().replace(" ", "_")
-    await db.collection(USERS).document(user_id).collection(MEMORIES).document(safe_key).delete()
+    await get_client().collection(USERS).document(user_id).collection(MEMORIES).document(safe_key).delete()
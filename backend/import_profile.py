@@ -0,0 +1,71 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Import-time profile of server startup.
+# Runs `python -X importtime` in a fresh interpreter and prints the slowest
+# modules, so cold-start regressions show up before a deploy. `import main` is
+# kept light on purpose, so by default the modules that lifespan and the first
+# session import are profiled with it: everything imported before the first
+# session can be served.
+#
+#   python import_profile.py                 # top 20 modules
+#   python import_profile.py --budget 1.0    # exit 1 if the imports take > 1.0s
+#   python import_profile.py --module main   # just the entrypoint
+
+STARTUP_MODULES = [
+    "main",
+    "agent.scheduler",         # lifespan (also pulls in agent.tools / agent.registry)
+    "google.cloud.firestore",  # lifespan, db.get_client() in a worker thread
+    "agent.client",            # first /ws/audio session
+]
+
+def profile_imports(modules):
+    """Return (total_s, [(module, self_us, cumulative_us)]) for a fresh import of `modules`."""
+    code = (
+        "import time; started = time.perf_counter(); "
+        f"import {', '.join(modules)}; "
+        "print(time.perf_counter() - started)"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {', '.join(modules)} failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        # Format: "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return float(proc.stdout.strip().splitlines()[-1]), rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile report")
+    parser.add_argument("--module", action="append", default=None,
+                        help="Module to import (repeatable; default: everything imported before the first session)")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Fail if total import time exceeds this many seconds")
+    args = parser.parse_args()
+
+    modules = args.module or STARTUP_MODULES
+    total_s, rows = profile_imports(modules)
+
+    print(f"import {', '.join(modules)}: {total_s:.3f}s ({len(rows)} modules)")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1e3:>10.1f}ms {self_us / 1e3:>8.1f}ms  {name}")
+
+    if args.budget is not None and total_s > args.budget:
+        print(f"FAIL: import time exceeds budget of {args.budget:.3f}s")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
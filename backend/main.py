@@ -1,28 +1,84 @@
 import asyncio
+import os
+import signal
+import time
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-# Import new DB wrapper (In-Memory)
+# Import new DB wrapper (Firestore client is built in lifespan, see below)
 import db
-from agent.client import GeminiAgent
-from agent.scheduler import check_alarms
+from agent.sessions import SessionManager, SESSION_IDLE_TIMEOUT, SESSION_ACTIVITY_RMS, CLOSE_TRY_AGAIN_LATER, CLOSE_INTERNAL_ERROR
+from agent.connections import ConnectionRegistry
 
-# Track active websockets for notifications
-active_sockets = set() # Changed to set for O(1) removals
+# Importing this module stays cheap: the scheduler and tool definitions are
+# imported in lifespan (before the server listens), the Gemini client and
+# audio codecs with the first /ws/audio session.
+
+# Opt-in: open channels and pre-build the setup payload before serving traffic
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0") == "1"
+
+# Live websockets by user/device, for alarm & timer notifications
+connections = ConnectionRegistry()
+
+# Live /ws/audio sessions: admission limit, idle reaping, drain on SIGTERM
+session_manager = SessionManager()
+
+async def warm_up():
+    """Pay the first-request costs up front, before readiness is reported."""
+    started = time.perf_counter()
+    from agent import client
+
+    # Profile read opens the Firestore gRPC channel (the client itself was
+    # built in lifespan); the result is kept as the setup payload for the
+    # first session.
+    try:
+        await client.prebuild_setup()
+    except Exception as e:
+        print(f"Warm-up Error: {e}", flush=True)
+
+    print(f"Warm-up finished in {time.perf_counter() - started:.2f}s", flush=True)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    print("Database Initialized (In-Memory)")
+    from agent.scheduler import check_alarms
+
+    # Build the Firestore client (library import, credential lookup) in a
+    # worker thread while nothing is being served yet, instead of on the event
+    # loop at the scheduler's first tick.
+    try:
+        await asyncio.to_thread(db.get_client)
+    except Exception as e:
+        print(f"Firestore Client Error: {e}", flush=True)
+
+    if WARMUP_ON_STARTUP:
+        await warm_up()
     
     # Start the background scheduler
-    task = asyncio.create_task(check_alarms(active_sockets))
+    task = asyncio.create_task(check_alarms(connections))
     print("Background Scheduler Started")
+
+    # Start draining as soon as SIGTERM arrives, then hand over to the server's
+    # own handler (uvicorn) so it stops listening and shuts down as usual.
+    loop = asyncio.get_running_loop()
+    previous_handler = signal.getsignal(signal.SIGTERM)
+
+    def on_sigterm(signum, frame):
+        loop.call_soon_threadsafe(session_manager.drain)
+        if callable(previous_handler):
+            previous_handler(signum, frame)
+
+    try:
+        signal.signal(signal.SIGTERM, on_sigterm)
+    except ValueError:
+        pass  # Not on the main thread (e.g. embedded in a test client)
     
     yield
     
     # Shutdown
+    await session_manager.drain()
     task.cancel()
     print("Scheduler Stopped")
 
@@ -37,12 +93,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Admin / diagnostics endpoints: only mounted when ADMIN_TOKEN is set
+if os.getenv("ADMIN_TOKEN"):
+    from admin import create_admin_router
+    app.include_router(create_admin_router(session_manager))
+
 # --- API Endpoints ---
 
 @app.get("/profile")
-async def get_profile():
+async def get_profile(user_id: str = db.DEFAULT_USER_ID):
     # Fetch flat profile directly from DB
-    raw_profile = await db.get_user_profile()
+    raw_profile = await db.get_user_profile(user_id)
     
     # Flatten "memories" list into top-level keys for Frontend
     # Raw: {"name": "Mukesh", "memories": [{"key": "color", "value": "red"}]}
@@ -58,59 +119,72 @@ async def get_profile():
     return flat_profile
 
 @app.get("/alarms")
-async def get_alarms():
-    return await db.get_active_alarms()
+async def get_alarms(user_id: str = db.DEFAULT_USER_ID):
+    return await db.get_active_alarms(user_id)
 
 @app.get("/timers")
-async def get_timers():
-    return await db.get_active_timers()
+async def get_timers(user_id: str = db.DEFAULT_USER_ID):
+    return await db.get_active_timers(user_id)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    return {"status": "ok", "sessions": session_manager.stats(), "connections": connections.stats()}
 
 # --- WebSocket ---
 
 @app.websocket("/ws/audio")
 async def websocket_endpoint(websocket: WebSocket):
     print("DEBUG: WebSocket /ws/audio hit!", flush=True)
-    await websocket.accept()
-    print("DEBUG: WebSocket accepted", flush=True)
-    active_sockets.add(websocket)
-    
-    input_queue = asyncio.Queue()  
-    output_queue = asyncio.Queue()
-    
-    client = GeminiAgent(websocket) # Adjusted: GeminiAgent takes websocket, runs internal loop
-    # Wait... GeminiAgent in previous code was agent = GeminiAgent(websocket) and await agent.run()
-    # But wait, my previous main.py had:
-    # client = GeminiClient()
-    # gemini_task = asyncio.create_task(client.connect(input_queue, output_queue))
-    
-    # Let me check my previous main.py again in the diff.
-    # Ah, step 1863... wait, step 1966 view_file showed:
-    # agent = GeminiAgent(websocket)
-    # await agent.run()
-    
-    # NO! Step 1966 line 99: agent = GeminiAgent(websocket)
-    # But before the revert (Step 1966 is the CURRENT file after revert?), I had separate GeminiClient.
-    # Step 1853 showed GeminiAgent taking `websocket`? No, GeminiAgent took `client_ws`.
-    # Let's stick to what was in Step 1966 which IS the current state.
-    
-    # Step 1966:
-    # agent = GeminiAgent(websocket)
-    # await agent.run()
-    
+
+    # Admission control: reject (or queue briefly) before doing any work
+    if not await session_manager.acquire():
+        print(f"DEBUG: WebSocket rejected, sessions: {session_manager.stats()}", flush=True)
+        # Accept first: closing before accept() turns into an HTTP 403 under
+        # uvicorn, which clients can't tell apart from an auth failure
+        await websocket.accept()
+        await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+        return
+
+    # Identity: there is no sign-in yet, so the client names itself and nothing
+    # verifies it (see agent/connections.py).
+    # /ws/audio?user_id=...&device_id=... (defaults: the single demo user, one device per socket)
+    user_id = websocket.query_params.get("user_id") or db.DEFAULT_USER_ID
+    device_id = websocket.query_params.get("device_id") or f"ws-{id(websocket):x}"
+
+    client = None
     try:
+        # Inside the try so the slot is released even if these fail
+        # (e.g. RECORD_SESSIONS_DIR not writable)
+        from agent.client import GeminiAgent
+        from agent.audio_codec import AUDIO_MODES
+
+        # Optional binary downstream audio: /ws/audio?audio=pcm16|mulaw
+        audio_codec = AUDIO_MODES.get(websocket.query_params.get("audio", "json"))
+        client = GeminiAgent(websocket, user_id=user_id, audio_codec=audio_codec,
+                             idle_timeout=SESSION_IDLE_TIMEOUT, activity_rms=SESSION_ACTIVITY_RMS)
+
+        await websocket.accept()
+        print(f"DEBUG: WebSocket accepted (user={user_id}, device={device_id})", flush=True)
+        session_manager.add(client)
+        # Registers the socket and delivers anything queued while the user was offline
+        await connections.add(user_id, device_id, websocket)
+
         await client.run()
     except WebSocketDisconnect:
         print("Client disconnected")
     except Exception as e:
         print(f"Connection error: {e}")
+        if websocket.client_state == WebSocketState.CONNECTING:
+            # Failed before accept (e.g. creating the agent): a server error,
+            # not the HTTP 403 an unaccepted socket would turn into
+            await websocket.accept()
+            await websocket.close(code=CLOSE_INTERNAL_ERROR)
     finally:
-        if websocket in active_sockets:
-            active_sockets.remove(websocket)
-        await client.close()
+        connections.remove(user_id, device_id, websocket)
+        session_manager.release()
+        if client is not None:
+            session_manager.remove(client)
+            await client.close()
 
 if __name__ == "__main__":
     import uvicorn
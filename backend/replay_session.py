@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+from collections import deque
+
+# Session Replay
+# Plays a recording (see agent/recorder.py, RECORD_SESSIONS_DIR) back through
+# main.app without network access:
+#   - a local stub stands in for the Gemini Live endpoint and sends the recorded
+#     upstream messages,
+#   - a local client sends the recorded browser messages to /ws/audio,
+#   - tool calls return their recorded results, the profile is a fixed stub.
+# Both sides follow the recorded timeline, at real time or as fast as possible,
+# and the relay's throughput and latency are reported.
+#
+#   python replay_session.py recordings/20260101-120000-7f3a.rec
+#   python replay_session.py recordings/20260101-120000-7f3a.rec --speed 0    # as fast as possible
+#   python replay_session.py recordings/20260101-120000-7f3a.rec --audio mulaw
+
+# Never record the replay itself
+os.environ.pop("RECORD_SESSIONS_DIR", None)
+
+import uvicorn
+import websockets
+
+import db
+import main
+from agent import client as agent_client
+from agent import recorder, scheduler
+from agent.audio_codec import AUDIO_MODES, split_audio
+
+REPLAY_PROFILE = {"name": "Replay", "city": "Nowhere", "timezone": "UTC", "gender": "Unknown", "memories": []}
+
+def load_recording(path: str):
+    meta = {}
+    timeline = []       # (offset, kind, payload) for CLIENT_IN(_BINARY) / UPSTREAM_IN
+    tool_results = {}   # name -> deque of recorded results
+    for offset, kind, payload in recorder.read_frames(path):
+        if kind == recorder.META:
+            meta = json.loads(payload)
+        elif kind in (recorder.CLIENT_IN, recorder.UPSTREAM_IN):
+            timeline.append((offset, kind, payload.decode()))
+        elif kind == recorder.CLIENT_IN_BINARY:
+            timeline.append((offset, kind, payload))
+        elif kind == recorder.TOOL_CALL:
+            call = json.loads(payload)
+            tool_results.setdefault(call["name"], deque()).append(call["result"])
+    return meta, timeline, tool_results
+
+def expected_client_frames(message: str, audio_codec) -> int:
+    """How many frames the relay sends to the browser for one upstream message."""
+    if audio_codec is None:
+        return 1
+    pcm_chunks, remainder = split_audio(json.loads(message))
+    return len(pcm_chunks) + (remainder is not None)
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def install_stubs(tool_results):
+    async def get_user_profile(user_id: str = "user_1"):
+        return REPLAY_PROFILE
+
+    async def execute_tool(name, args, user_id=None):
+        results = tool_results.get(name)
+        return results.popleft() if results else "Tool not found"
+
+    async def check_alarms(connections):
+        await asyncio.Event().wait()
+
+    db.get_client = lambda: None  # No Firestore client (or credentials) needed
+    db.get_user_profile = get_user_profile
+    agent_client.execute_tool = execute_tool
+    scheduler.check_alarms = check_alarms
+
+async def replay(path: str, speed: float, audio: str):
+    meta, timeline, tool_results = load_recording(path)
+    if audio is None:
+        codec = meta.get("audio_codec")
+        audio = next((name for name, c in AUDIO_MODES.items() if c == codec), "json")
+    audio_codec = AUDIO_MODES.get(audio)
+    install_stubs(tool_results)
+
+    # Work out what to expect before the clock starts
+    def expected_frames(kind, payload):
+        if kind == recorder.UPSTREAM_IN:
+            return expected_client_frames(payload, audio_codec)
+        if kind == recorder.CLIENT_IN_BINARY:
+            return 1
+        return int('"realtime_input"' in payload)
+
+    plan = [(offset, kind, payload, expected_frames(kind, payload)) for offset, kind, payload in timeline]
+    total_expected = sum(n for _, kind, _, n in plan if kind == recorder.UPSTREAM_IN)
+
+    stats = {"client_frames": 0, "client_bytes": 0, "upstream_frames": 0, "upstream_bytes": 0}
+    down_pending = deque()  # [sent_at, frames_left, first_seen]
+    up_pending = deque()    # sent_at
+    down_latency, up_latency = [], []
+    all_received = asyncio.Event()
+    upstream = {"ws": None, "ready": asyncio.Event()}
+
+    # --- Stub Gemini endpoint ---
+    async def stub_upstream(ws):
+        upstream["ws"] = ws
+        try:
+            async for msg in ws:
+                if msg.startswith('{"setup"'):
+                    upstream["ready"].set()
+                elif not msg.startswith('{"toolResponse"'):
+                    stats["upstream_frames"] += 1
+                    stats["upstream_bytes"] += len(msg)
+                    if up_pending:
+                        up_latency.append(time.perf_counter() - up_pending.popleft())
+        finally:
+            if upstream["ws"] is ws:
+                upstream["ws"] = None
+                upstream["ready"].clear()
+
+    stub = await websockets.serve(stub_upstream, "127.0.0.1", 0)
+    agent_client.URI = f"ws://127.0.0.1:{stub.sockets[0].getsockname()[1]}"
+
+    # --- main.app on a local port ---
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    query = "" if audio_codec is None else f"?audio={audio}"
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws/audio{query}", max_size=None) as browser:
+        async def read_browser():
+            async for frame in browser:
+                now = time.perf_counter()
+                if isinstance(frame, str) and frame.startswith('{"type":"hello"'):
+                    continue  # Session greeting, not a relayed message
+                stats["client_frames"] += 1
+                stats["client_bytes"] += len(frame)
+                if down_pending:
+                    entry = down_pending[0]
+                    if not entry[2]:
+                        down_latency.append(now - entry[0])
+                        entry[2] = True
+                    entry[1] -= 1
+                    if entry[1] <= 0:
+                        down_pending.popleft()
+                if stats["client_frames"] >= total_expected:
+                    all_received.set()
+
+        reader = asyncio.create_task(read_browser())
+        if total_expected == 0:
+            all_received.set()
+
+        started = time.perf_counter()
+        for offset, kind, payload, expected in plan:
+            if speed > 0:
+                delay = started + offset / speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            if kind != recorder.UPSTREAM_IN:
+                if expected:
+                    up_pending.append(time.perf_counter())
+                await browser.send(payload)
+            else:
+                # The relay (re)opens the upstream lazily; wait for its setup
+                await asyncio.wait_for(upstream["ready"].wait(), 10)
+                down_pending.append([time.perf_counter(), expected, False])
+                await upstream["ws"].send(payload)
+
+        try:
+            await asyncio.wait_for(all_received.wait(), 10)
+        except asyncio.TimeoutError:
+            print("WARNING: not every expected frame reached the client", file=sys.stderr)
+        elapsed = time.perf_counter() - started
+        reader.cancel()
+
+    server.should_exit = True
+    await server_task
+    stub.close()
+    await stub.wait_closed()
+
+    recorded = timeline[-1][0] if timeline else 0.0
+    return {
+        "recording": os.path.basename(path),
+        "audio": audio,
+        "speed": speed or "max",
+        "recorded_s": round(recorded, 2),
+        "replayed_s": round(elapsed, 3),
+        "upstream_msgs_sent": sum(1 for p in plan if p[1] == recorder.UPSTREAM_IN),
+        "client_msgs_sent": sum(1 for p in plan if p[1] != recorder.UPSTREAM_IN),
+        **stats,
+        "client_mb_per_s": round(stats["client_bytes"] / elapsed / 1e6, 3) if elapsed else None,
+        "downstream_latency_ms": {"p50": percentile(down_latency, 0.5), "p99": percentile(down_latency, 0.99), "max": percentile(down_latency, 1.0)},
+        "upstream_latency_ms": {"p50": percentile(up_latency, 0.5), "p99": percentile(up_latency, 0.99), "max": percentile(up_latency, 1.0)},
+    }
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Replay a recorded /ws/audio session through main.app")
+    parser.add_argument("recording")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = real time, 2 = twice as fast, 0 = as fast as possible")
+    parser.add_argument("--audio", choices=["json", *AUDIO_MODES], default=None,
+                        help="Downstream mode (default: the one that was recorded)")
+    args = parser.parse_args()
+
+    result = asyncio.run(replay(args.recording, args.speed, args.audio))
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main_cli()
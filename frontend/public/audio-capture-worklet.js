@@ -0,0 +1,40 @@
+// Microphone capture processor (runs on the audio rendering thread).
+// Collects 128-sample render quanta into frames of `frameSize` samples,
+// converts Float32 -> PCM16 and hands each frame's buffer to the main thread
+// by transfer (no copy).
+
+class PcmCaptureProcessor extends AudioWorkletProcessor {
+    constructor(options) {
+        super();
+        const { frameSize = 480 } = options.processorOptions || {};
+        this.frame = new Int16Array(frameSize);
+        this.offset = 0;
+    }
+
+    process(inputs) {
+        const channel = inputs[0] && inputs[0][0];
+        if (!channel) return true;
+
+        let i = 0;
+        while (i < channel.length) {
+            const count = Math.min(channel.length - i, this.frame.length - this.offset);
+            for (let j = 0; j < count; j++) {
+                const s = channel[i + j];
+                this.frame[this.offset + j] = s < 0 ? Math.max(-1, s) * 0x8000 : Math.min(1, s) * 0x7fff;
+            }
+            i += count;
+            this.offset += count;
+
+            if (this.offset === this.frame.length) {
+                const buffer = this.frame.buffer;
+                this.port.postMessage(buffer, [buffer]);
+                // The old buffer now belongs to the main thread
+                this.frame = new Int16Array(this.frame.length);
+                this.offset = 0;
+            }
+        }
+        return true;
+    }
+}
+
+registerProcessor("pcm-capture", PcmCaptureProcessor);
@@ -9,6 +9,9 @@ import clsx from 'clsx';
 
 export default function Home() {
   const BACKEND_URL = process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:8000";
+  // Model audio downstream: "pcm16" (binary, lossless), "mulaw" (binary, half the bytes, lossy)
+  // or "json" (legacy base64 inside JSON)
+  const AUDIO_MODE = process.env.NEXT_PUBLIC_AUDIO_MODE || "pcm16";
 
   const [isConnected, setIsConnected] = useState(false);
   const [isRecording, setIsRecording] = useState(false);
@@ -67,6 +70,12 @@ export default function Home() {
   const audioLoopRef = useRef<AudioLoop | null>(null);
   const audioPlayerRef = useRef<AudioPlayer | null>(null);
   const alarmAudioRef = useRef<HTMLAudioElement | null>(null);
+  // Set when the backend's hello says it accepts raw PCM16 binary frames
+  const binaryInputRef = useRef(false);
+  // Per-tab device id (not stored: storage is shared by other or duplicated tabs,
+  // whose sockets would then replace each other). Reconnects from this tab reuse it.
+  // Math.random rather than crypto.randomUUID, which needs a secure origin.
+  const deviceIdRef = useRef(Math.random().toString(36).slice(2) + Date.now().toString(36));
 
   // Initialize alarm audio
   useEffect(() => {
@@ -86,9 +95,10 @@ export default function Home() {
     if (websocketRef.current) return;
 
     // Derive WS URL from HTTP URL (http -> ws, https -> wss)
-    const wsUrl = BACKEND_URL.replace(/^http/, "ws") + "/ws/audio";
+    const wsUrl = BACKEND_URL.replace(/^http/, "ws") + `/ws/audio?audio=${AUDIO_MODE}&device_id=${deviceIdRef.current}`;
 
     const ws = new WebSocket(wsUrl);
+    ws.binaryType = "arraybuffer";
     audioPlayerRef.current = new AudioPlayer(24000);
 
     ws.onopen = () => {
@@ -97,6 +107,7 @@ export default function Home() {
     };
 
     ws.onclose = () => {
+      binaryInputRef.current = false;
       setIsConnected(false);
       setIsRecording(false);
       setStatus("Disconnected");
@@ -104,8 +115,20 @@ export default function Home() {
     };
 
     ws.onmessage = async (event) => {
+      // Binary frame = model audio
+      if (event.data instanceof ArrayBuffer) {
+        stopAlarm();
+        audioPlayerRef.current?.playFrame(event.data);
+        return;
+      }
+
       const data = JSON.parse(event.data);
 
+      if (data.type === "hello") {
+        binaryInputRef.current = !!data.binary_audio_in;
+        return;
+      }
+
       // Handle Notification
       if (data.type === "notification") {
         setIsRinging(true);
@@ -138,10 +161,15 @@ export default function Home() {
       if (!websocketRef.current) connect();
 
       try {
-        const loop = new AudioLoop();
-        loop.onAudioData = (base64Data) => {
-          if (websocketRef.current && websocketRef.current.readyState === WebSocket.OPEN) {
-            websocketRef.current.send(JSON.stringify({ realtime_input: { media_chunks: [{ mime_type: "audio/pcm", data: base64Data }] } }));
+        // 20ms frames at 24kHz
+        const loop = new AudioLoop({ sampleRate: 24000, frameSize: 480 });
+        loop.onAudioFrame = (frame) => {
+          const ws = websocketRef.current;
+          if (!ws || ws.readyState !== WebSocket.OPEN) return;
+          if (binaryInputRef.current) {
+            ws.send(frame);
+          } else {
+            ws.send(JSON.stringify({ realtime_input: { media_chunks: [{ mime_type: "audio/pcm", data: loop.arrayBufferToBase64(frame) }] } }));
           }
         };
         await loop.start();
@@ -217,7 +245,9 @@ export default function Home() {
                       timeZone: profile.timezone // Use User Profile Timezone
                     })}
                   </span>
-                  <span className="text-gray-400 text-xs">{a.label}</span>
+                  <span className="text-gray-400 text-xs">
+                    {a.label}{a.recurrence ? ` · ${a.recurrence.repeat}` : ""}
+                  </span>
                 </li>
               ))}
             </ul>
@@ -5,42 +5,64 @@ export type AudioConfig = {
     encoding: "linear16" | "pcm";
 };
 
+export type AudioLoopOptions = {
+    sampleRate?: number;
+    // Samples per captured frame: 480 @ 24kHz = 20ms. Smaller = lower latency, more messages.
+    frameSize?: number;
+};
+
+const WORKLET_URL = "/audio-capture-worklet.js";
+
 export class AudioLoop {
     private context: AudioContext | null = null;
     private source: MediaStreamAudioSourceNode | null = null;
+    private worklet: AudioWorkletNode | null = null;
     private processor: ScriptProcessorNode | null = null;
     private stream: MediaStream | null = null;
+    private sampleRate: number;
+    private frameSize: number;
+    // Raw PCM16 frame (preferred: send as a binary WebSocket frame)
+    public onAudioFrame: ((frame: ArrayBuffer) => void) | null = null;
+    // Base64 PCM16 frame, for backends without binary input
     public onAudioData: ((data: string) => void) | null = null;
 
-    constructor() {}
+    constructor({ sampleRate = 24000, frameSize = 480 }: AudioLoopOptions = {}) {
+        this.sampleRate = sampleRate;
+        this.frameSize = frameSize;
+    }
 
     async start() {
         try {
-            this.stream = await navigator.mediaDevices.getUserMedia({ 
-                audio: { 
-                    channelCount: 1, 
-                    sampleRate: 24000 
-                } 
+            this.stream = await navigator.mediaDevices.getUserMedia({
+                audio: {
+                    channelCount: 1,
+                    sampleRate: this.sampleRate
+                }
             });
-            this.context = new AudioContext({ sampleRate: 24000 });
+            this.context = new AudioContext({ sampleRate: this.sampleRate });
             this.source = this.context.createMediaStreamSource(this.stream);
-            
-            // Function to convert Float32 to PCM16 (base64)
-            this.processor = this.context.createScriptProcessor(4096, 1, 1);
-            
-            this.processor.onaudioprocess = (e) => {
-                if (!this.onAudioData) return;
-                
-                const inputData = e.inputBuffer.getChannelData(0);
-                const pcmData = this.floatTo16BitPCM(inputData);
-                const base64Data = this.arrayBufferToBase64(pcmData);
-                
-                this.onAudioData(base64Data);
-            };
 
-            this.source.connect(this.processor);
-            this.processor.connect(this.context.destination);
-            
+            if (this.context.audioWorklet) {
+                // Conversion happens on the audio thread; frames arrive by transfer
+                await this.context.audioWorklet.addModule(WORKLET_URL);
+                this.worklet = new AudioWorkletNode(this.context, "pcm-capture", {
+                    numberOfInputs: 1,
+                    numberOfOutputs: 0,
+                    channelCount: 1,
+                    processorOptions: { frameSize: this.frameSize },
+                });
+                this.worklet.port.onmessage = (e: MessageEvent<ArrayBuffer>) => this.emit(e.data);
+                this.source.connect(this.worklet);
+            } else {
+                // Fallback for browsers without AudioWorklet (or insecure origins)
+                this.processor = this.context.createScriptProcessor(this.fallbackBufferSize(), 1, 1);
+                this.processor.onaudioprocess = (e) => {
+                    this.emit(this.floatTo16BitPCM(e.inputBuffer.getChannelData(0)));
+                };
+                this.source.connect(this.processor);
+                this.processor.connect(this.context.destination);
+            }
+
         } catch (error) {
             console.error("Error starting audio loop:", error);
             throw error;
@@ -48,6 +70,11 @@ export class AudioLoop {
     }
 
     stop() {
+        if (this.worklet) {
+            this.worklet.port.onmessage = null;
+            this.worklet.disconnect();
+            this.worklet = null;
+        }
         if (this.processor) {
             this.processor.disconnect();
             this.processor = null;
@@ -66,24 +93,37 @@ export class AudioLoop {
         }
     }
 
+    private emit(frame: ArrayBuffer) {
+        if (this.onAudioFrame) {
+            this.onAudioFrame(frame);
+        } else if (this.onAudioData) {
+            this.onAudioData(this.arrayBufferToBase64(frame));
+        }
+    }
+
+    private fallbackBufferSize(): number {
+        // ScriptProcessor only takes powers of two between 256 and 16384
+        let size = 256;
+        while (size < this.frameSize && size < 16384) size *= 2;
+        return size;
+    }
+
     private floatTo16BitPCM(input: Float32Array): ArrayBuffer {
-        const output = new DataView(new ArrayBuffer(input.length * 2));
+        const output = new Int16Array(input.length);
         for (let i = 0; i < input.length; i++) {
-            let s = Math.max(-1, Math.min(1, input[i]));
-            // s = s < 0 ? s * 0x8000 : s * 0x7FFF;
-            s = s < 0 ? s * 32768 : s * 32767;
-            output.setInt16(i * 2, s, true); // little-endian
+            const s = input[i];
+            output[i] = s < 0 ? Math.max(-1, s) * 0x8000 : Math.min(1, s) * 0x7fff;
         }
         return output.buffer;
     }
 
-    private arrayBufferToBase64(buffer: ArrayBuffer): string {
-        let binary = '';
+    arrayBufferToBase64(buffer: ArrayBuffer): string {
+        // Chunked: one fromCharCode call per 32KB instead of one per byte
         const bytes = new Uint8Array(buffer);
-        const len = bytes.byteLength;
-        for (let i = 0; i < len; i++) {
-            binary += String.fromCharCode(bytes[i]);
+        const chunks: string[] = [];
+        for (let i = 0; i < bytes.length; i += 0x8000) {
+            chunks.push(String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000) as unknown as number[]));
         }
-        return btoa(binary);
+        return btoa(chunks.join(""));
     }
 }
@@ -1,3 +1,20 @@
+// Binary downstream frames (backend agent/audio_codec.py):
+// byte 0 = codec id, rest = little-endian PCM16 or G.711 mu-law.
+export const CODEC_PCM16 = 0;
+export const CODEC_MULAW = 1;
+
+const MULAW_DECODE_TABLE = (() => {
+    const table = new Int16Array(256);
+    for (let i = 0; i < 256; i++) {
+        const u = ~i & 0xff;
+        const exponent = (u >> 4) & 0x07;
+        const mantissa = u & 0x0f;
+        const sample = (((mantissa << 3) + 0x84) << exponent) - 0x84;
+        table[i] = u & 0x80 ? -sample : sample;
+    }
+    return table;
+})();
+
 export class AudioPlayer {
     private context: AudioContext;
     private nextStartTime: number = 0;
@@ -7,7 +24,25 @@ export class AudioPlayer {
     }
 
     play(base64PCM: string) {
-        const pcmData = this.base64ToInt16(base64PCM);
+        this.playPCM16(this.base64ToInt16(base64PCM));
+    }
+
+    playFrame(frame: ArrayBuffer) {
+        const codec = new Uint8Array(frame, 0, 1)[0];
+        if (codec === CODEC_MULAW) {
+            const encoded = new Uint8Array(frame, 1);
+            const pcmData = new Int16Array(encoded.length);
+            for (let i = 0; i < encoded.length; i++) {
+                pcmData[i] = MULAW_DECODE_TABLE[encoded[i]];
+            }
+            this.playPCM16(pcmData);
+        } else if (codec === CODEC_PCM16) {
+            // Payload starts at an odd offset, so copy it out before viewing as Int16
+            this.playPCM16(new Int16Array(frame.slice(1)));
+        }
+    }
+
+    playPCM16(pcmData: Int16Array) {
         const float32Data = this.int16ToFloat32(pcmData);
 
         const buffer = this.context.createBuffer(1, float32Data.length, this.context.sampleRate);